@@ -1,17 +1,34 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, Response
+import hashlib
 from flask_cors import CORS
 import os
 import json
 import tempfile
 import shutil
+import threading
+import time
 from werkzeug.utils import secure_filename
-from test import main as process_photos
+from test import process_photos
 import traceback
-import time  # Add this import
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib encoder
+    orjson = None
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React Native
 
+# GLBs are uncompressed JSON + vertex data, so gzip/brotli typically shaves
+# 20-40% off the wire size. Optional - the server runs fine without it.
+try:
+    from flask_compress import Compress
+    app.config['COMPRESS_MIMETYPES'] = ['model/gltf-binary', 'application/json']
+    app.config['COMPRESS_LEVEL'] = 6
+    Compress(app)
+except ImportError:
+    pass
+
 # Configuration
 UPLOAD_FOLDER = './temp_uploads'
 MODEL_FOLDER = './temp_models'
@@ -22,6 +39,10 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MODEL_FOLDER'] = MODEL_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
 
+# Let a fronting server (nginx X-Accel-Redirect / Apache X-Sendfile) push GLBs
+# with sendfile(2) instead of streaming them through Python.
+app.use_x_sendfile = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true')
+
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(MODEL_FOLDER, exist_ok=True)
@@ -29,18 +50,117 @@ os.makedirs(MODEL_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _fast_copy(src, dst):
+    """Copy src to dst without pulling the bytes through userspace when possible.
+
+    Tries os.copy_file_range (kernel-side copy, CoW/server-side on supporting
+    filesystems), then os.sendfile, then falls back to a buffered readinto loop.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        in_fd = fsrc.fileno()
+        out_fd = fdst.fileno()
+        remaining = os.fstat(in_fd).st_size
+
+        # Reserve the full extent up front - avoids block-by-block allocation
+        # and fragmentation as the copy grows the file
+        if remaining > 0 and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(out_fd, 0, remaining)
+            except OSError:
+                pass  # not supported on this filesystem - allocation just grows lazily
+
+        # Both syscall paths advance the file offsets, so a partial copy can be
+        # resumed by the next strategy without any seeking.
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(in_fd, out_fd, remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            except OSError:
+                pass  # EXDEV/ENOSYS etc. - try the next strategy
+
+        if remaining > 0 and hasattr(os, 'sendfile'):
+            try:
+                while remaining > 0:
+                    sent = os.sendfile(out_fd, in_fd, None, remaining)
+                    if sent == 0:
+                        break
+                    remaining -= sent
+            except OSError:
+                pass  # sendfile-to-file unsupported - fall back to read/write
+
+        if remaining > 0:
+            buffer = bytearray(1 << 20)  # 1 MiB
+            view = memoryview(buffer)
+            while True:
+                read = fsrc.readinto(view)
+                if not read:
+                    break
+                fdst.write(view[:read])
+
+def _write_bytes(path, data):
+    """Write data to path, swallowing errors (used for best-effort debug files)."""
+    try:
+        with open(path, 'wb') as f:
+            f.write(data)
+    except OSError as e:
+        print(f"⚠️  Failed to write {path}: {e}")
+
+def _atomic_write(path, data):
+    """Write data to path without ever exposing a partially written file.
+
+    Writes to a temp file in the same directory, fsyncs, then renames over
+    the target - readers (the /static-glb cache, a fronting X-Sendfile
+    server) only ever see the old bytes or the complete new ones.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+# Sessions younger than this survive cleanup_old_files - with threaded=True
+# another client may still be mid-upload into its session directory
+SESSION_MAX_AGE_SECONDS = 3600
+
 def cleanup_old_files():
     """Clean up old uploads and models"""
     try:
-        # Clean upload folder
-        if os.path.exists(UPLOAD_FOLDER):
-            shutil.rmtree(UPLOAD_FOLDER)
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        
-        # Clean model folder
-        if os.path.exists(MODEL_FOLDER):
-            shutil.rmtree(MODEL_FOLDER)
-        os.makedirs(MODEL_FOLDER, exist_ok=True)
+        # rename() is O(1) per session, so the request only pays for moving
+        # stale session folders aside; the recursive delete of the renamed
+        # copies happens on a background thread instead of blocking
+        # generate_glb. Recent sessions are left in place (a directory's
+        # mtime refreshes whenever a photo lands in it).
+        cutoff = time.time() - SESSION_MAX_AGE_SECONDS
+        trash_dirs = []
+        for folder in (UPLOAD_FOLDER, MODEL_FOLDER):
+            os.makedirs(folder, exist_ok=True)
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                    trash = f"{path}.trash.{time.time_ns()}"
+                    os.rename(path, trash)
+                    trash_dirs.append(trash)
+                except OSError:
+                    # Raced another cleanup or the session vanished - skip
+                    continue
+
+        if trash_dirs:
+            def _burn(paths):
+                for path in paths:
+                    shutil.rmtree(path, ignore_errors=True)
+            threading.Thread(target=_burn, args=(trash_dirs,), daemon=True).start()
     except Exception as e:
         print(f"Error cleaning up old files: {e}")
 
@@ -77,159 +197,189 @@ def generate_glb():
         
         print(f"📸 Received {len(files)} photo files")
         
-        # Create session-specific directories
-        session_id = str(hash(str(photo_data[0]['timestamp']) if photo_data else 'default'))
+        # Create session-specific directories. blake2b is stable across
+        # processes (builtin hash() is salted per interpreter, so gunicorn
+        # workers would disagree on the id for the same capture session).
+        session_seed = str(photo_data[0]['timestamp']) if photo_data else 'default'
+        session_id = hashlib.blake2b(session_seed.encode(), digest_size=8).hexdigest()
         session_upload_dir = os.path.join(UPLOAD_FOLDER, session_id)
         session_model_dir = os.path.join(MODEL_FOLDER, session_id)
-        
+
         os.makedirs(session_upload_dir, exist_ok=True)
         os.makedirs(session_model_dir, exist_ok=True)
-        
-        # Save uploaded photos
-        saved_files = []
+
+        # Read uploaded photos straight from the multipart stream - the
+        # pipeline runs in memory, so there is no need to spill them to disk
+        image_bytes = []
         for i, file in enumerate(files):
             if file and allowed_file(file.filename):
-                # Use index-based naming to match photo data
-                filename = f"photo_{i}.jpg"
-                filepath = os.path.join(session_upload_dir, filename)
-                file.save(filepath)
-                saved_files.append(filepath)
-                print(f"✅ Saved photo {i}: {filename}")
-        
-        if len(saved_files) == 0:
-            return jsonify({'error': 'No valid photos were saved'}), 400
-        
-        # Update photo data with correct file paths
+                image_bytes.append(file.stream.read())
+                print(f"✅ Read photo {i}: {file.filename}")
+
+        if len(image_bytes) == 0:
+            return jsonify({'error': 'No valid photos were received'}), 400
+
+        # Update photo data with index-based names matching the upload order
         for i, data_point in enumerate(photo_data):
-            data_point['photoUri'] = f"photo_{i}.jpg"  # Use relative path
-        
-        # Save rotation.json
+            data_point['photoUri'] = f"photo_{i}.jpg"
+
+        # Keep a copy of the rotation data around for debugging failed sessions.
+        # One compact binary write - pretty-printing doubled the file size and
+        # stdlib json trickled it out in many small writes. The file is purely
+        # diagnostic, so it is written on a background thread rather than
+        # blocking the request on disk I/O.
         rotation_file = os.path.join(session_upload_dir, 'rotation.json')
-        with open(rotation_file, 'w') as f:
-            json.dump(photo_data, f, indent=2)
-        
-        print(f"💾 Saved rotation data: {rotation_file}")
-        
-        # Run Python processing
+        if orjson is not None:
+            rotation_bytes = orjson.dumps(photo_data)
+        else:
+            rotation_bytes = json.dumps(photo_data, separators=(',', ':')).encode()
+        threading.Thread(target=_write_bytes, args=(rotation_file, rotation_bytes),
+                         daemon=True).start()
+
+        print(f"💾 Saving rotation data: {rotation_file}")
+
+        # Run Python processing in-process on the in-memory photos
         print("🐍 Starting Python processing...")
-        
-        # Change to the upload directory and run processing
-        original_cwd = os.getcwd()
-        try:
-            os.chdir(session_upload_dir)
-            
-            # Create required subdirectories
-            os.makedirs('photos', exist_ok=True)
-            os.makedirs('masks', exist_ok=True)
-            os.makedirs('model', exist_ok=True)
-            
-            # Move photos to photos subdirectory
-            for i in range(len(saved_files)):
-                src = f"photo_{i}.jpg"
-                dst = f"photos/photo_{i}.jpg"
-                if os.path.exists(src):
-                    shutil.move(src, dst)
-            
-            # Run the processing
-            process_photos('rotation.json')
-            
-            # Wait for GLB file to be generated with timeout
-            glb_path = 'model/dome_sky_model.glb'
-            max_wait_time = 30  # 30 seconds timeout
-            wait_interval = 0.5  # Check every 500ms
-            waited_time = 0
-            
-            print(f"🔍 Waiting for GLB file: {glb_path}")
-            
-            while not os.path.exists(glb_path) and waited_time < max_wait_time:
-                time.sleep(wait_interval)
-                waited_time += wait_interval
-                if waited_time % 2 == 0:  # Log every 2 seconds
-                    print(f"⏳ Still waiting for GLB... ({waited_time}s/{max_wait_time}s)")
-            
-            if os.path.exists(glb_path):
-                # Additional check: make sure file is not empty and stable
-                file_size = os.path.getsize(glb_path)
-                if file_size > 0:
-                    # Wait a bit more to ensure file is completely written
-                    time.sleep(1)
-                    print(f"✅ GLB file found: {glb_path} (size: {file_size} bytes)")
-
-                    # FIXED: Create absolute paths to avoid same file error
-                    source_glb_absolute = os.path.abspath(glb_path)
-                    static_glb_absolute = os.path.abspath(os.path.join(original_cwd, STATIC_GLB_PATH))
-                    
-                    # Only copy if they're different files
-                    if source_glb_absolute != static_glb_absolute:
-                        os.makedirs(os.path.dirname(static_glb_absolute), exist_ok=True)
-                        shutil.copy2(source_glb_absolute, static_glb_absolute)
-                        print(f"✅ GLB updated at static path: {static_glb_absolute}")
-                    else:
-                        print(f"ℹ️ GLB already at correct location: {static_glb_absolute}")
-                    
-                    # Copy GLB to session model directory
-                    final_glb_path = os.path.join(original_cwd, MODEL_FOLDER, session_id, 'dome_sky_model.glb')
-                    
-                    print(f"📁 Copying from: {source_glb_absolute}")
-                    print(f"📁 Copying to: {final_glb_path}")
-                    
-                    # Make sure destination directory exists
-                    final_dir = os.path.dirname(final_glb_path)
-                    os.makedirs(final_dir, exist_ok=True)
-                    
-                    # Only copy if they're different files
-                    final_glb_absolute = os.path.abspath(final_glb_path)
-                    if source_glb_absolute != final_glb_absolute:
-                        shutil.copy2(source_glb_absolute, final_glb_path)
-                        print(f"✅ GLB copied to session directory: {final_glb_path}")
-                    else:
-                        print(f"ℹ️ GLB already at session location: {final_glb_path}")
-                    
-                    # Verify the copy was successful (check either location)
-                    if os.path.exists(final_glb_path) or os.path.exists(static_glb_absolute):
-                        file_size_final = os.path.getsize(final_glb_path) if os.path.exists(final_glb_path) else file_size
-                        print(f"✅ GLB processing completed successfully (size: {file_size_final} bytes)")
-                        
-                        # Return success with download URL
-                        download_url = f"/download-glb/{session_id}"
-                        
-                        return jsonify({
-                            'success': True,
-                            'message': 'GLB generated successfully',
-                            'download_url': download_url,
-                            'session_id': session_id,
-                            'photos_processed': len(saved_files)
-                        })
-                    else:
-                        print(f"❌ Failed to verify GLB file creation")
-                        return jsonify({'error': 'Failed to verify GLB file'}), 500
-                else:
-                    print(f"❌ GLB file exists but is empty: {glb_path}")
-                    return jsonify({'error': 'GLB file is empty'}), 500
-            else:
-                print(f"❌ GLB file not found after {max_wait_time}s timeout")
-                print(f"📁 Contents of session_upload_dir: {os.listdir('.')}")
-                if os.path.exists('model'):
-                    print(f"📁 Contents of model dir: {os.listdir('model')}")
-                return jsonify({'error': 'GLB file was not generated within timeout'}), 500
-                
-        finally:
-            os.chdir(original_cwd)
-        
+        glb_bytes = process_photos(photo_data, image_bytes)
+
+        if not glb_bytes:
+            print(f"❌ Processing produced no GLB data")
+            return jsonify({'error': 'GLB generation produced no data'}), 500
+
+        # Write the GLB once to the static path, then copy to the session dir
+        static_glb_absolute = os.path.abspath(STATIC_GLB_PATH)
+        os.makedirs(os.path.dirname(static_glb_absolute), exist_ok=True)
+        _atomic_write(static_glb_absolute, glb_bytes)
+        print(f"✅ GLB written to static path: {static_glb_absolute} (size: {len(glb_bytes)} bytes)")
+
+        final_glb_path = os.path.join(session_model_dir, 'dome_sky_model.glb')
+        _fast_copy(static_glb_absolute, final_glb_path + '.tmp')
+        os.replace(final_glb_path + '.tmp', final_glb_path)
+        print(f"✅ GLB copied to session directory: {final_glb_path}")
+
+        # Return success with download URL
+        download_url = f"/download-glb/{session_id}"
+
+        return jsonify({
+            'success': True,
+            'message': 'GLB generated successfully',
+            'download_url': download_url,
+            'session_id': session_id,
+            'photos_processed': len(image_bytes)
+        })
+
     except Exception as e:
         print(f"❌ Error in generate_glb: {e}")
         print(traceback.format_exc())
         return jsonify({'error': f'Server error: {str(e)}'}), 500
     
+@app.route('/upload-photo/<session_id>/<int:index>', methods=['POST'])
+def upload_photo(session_id, index):
+    """Accept a single photo as a raw binary body.
+
+    Streaming the body straight to disk in 1 MiB chunks sidesteps
+    werkzeug's multipart parser, which is CPU-bound on large uploads.
+    Pair with POST /generate-glb/<session_id> once all photos are up.
+    """
+    try:
+        session_upload_dir = os.path.join(UPLOAD_FOLDER, secure_filename(session_id))
+        os.makedirs(session_upload_dir, exist_ok=True)
+
+        filepath = os.path.join(session_upload_dir, f"photo_{index}.jpg")
+        with open(filepath, 'wb') as dst:
+            shutil.copyfileobj(request.stream, dst, length=1 << 20)
+
+        size = os.path.getsize(filepath)
+        print(f"✅ Uploaded photo {index} for session {session_id} ({size} bytes)")
+        return jsonify({'success': True, 'index': index, 'size': size})
+    except Exception as e:
+        print(f"❌ Error uploading photo: {e}")
+        return jsonify({'error': f'Upload error: {str(e)}'}), 500
+
+@app.route('/generate-glb/<session_id>', methods=['POST'])
+def generate_glb_session(session_id):
+    """Generate the GLB from photos previously sent via /upload-photo.
+
+    The request body is the photoData JSON array; photos are read back
+    from the session upload directory in index order.
+    """
+    try:
+        photo_data = request.get_json(force=True)
+        if not isinstance(photo_data, list) or len(photo_data) == 0:
+            return jsonify({'error': 'photoData must be a non-empty JSON array'}), 400
+
+        session_upload_dir = os.path.join(UPLOAD_FOLDER, secure_filename(session_id))
+        session_model_dir = os.path.join(MODEL_FOLDER, secure_filename(session_id))
+        os.makedirs(session_model_dir, exist_ok=True)
+
+        image_bytes = []
+        for i, data_point in enumerate(photo_data):
+            data_point['photoUri'] = f"photo_{i}.jpg"
+            filepath = os.path.join(session_upload_dir, f"photo_{i}.jpg")
+            if not os.path.exists(filepath):
+                return jsonify({'error': f'Missing uploaded photo {i}'}), 400
+            with open(filepath, 'rb') as f:
+                image_bytes.append(f.read())
+
+        print(f"🐍 Starting Python processing for session {session_id}...")
+        glb_bytes = process_photos(photo_data, image_bytes)
+
+        if not glb_bytes:
+            return jsonify({'error': 'GLB generation produced no data'}), 500
+
+        static_glb_absolute = os.path.abspath(STATIC_GLB_PATH)
+        os.makedirs(os.path.dirname(static_glb_absolute), exist_ok=True)
+        _atomic_write(static_glb_absolute, glb_bytes)
+
+        final_glb_path = os.path.join(session_model_dir, 'dome_sky_model.glb')
+        _fast_copy(static_glb_absolute, final_glb_path + '.tmp')
+        os.replace(final_glb_path + '.tmp', final_glb_path)
+
+        return jsonify({
+            'success': True,
+            'message': 'GLB generated successfully',
+            'download_url': f"/download-glb/{session_id}",
+            'session_id': session_id,
+            'photos_processed': len(image_bytes)
+        })
+    except Exception as e:
+        print(f"❌ Error in generate_glb_session: {e}")
+        print(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+# In-memory cache for the static GLB - the UI polls this endpoint, so repeat
+# hits should not re-read the file from disk. Kept as one (mtime, etag,
+# data) tuple so the swap is a single atomic assignment: a reader under
+# threaded=True always sees an ETag paired with its own body, never a mix
+# of two versions.
+_glb_cache = (0, None, None)
+
 # Add a new endpoint to serve the static GLB
 @app.route('/static-glb', methods=['GET'])
 def get_static_glb():
     """Serve the static GLB file that gets overwritten with each generation."""
+    global _glb_cache
     try:
-        if os.path.exists(STATIC_GLB_PATH):
-            return send_from_directory('./model', 'dome_sky_model.glb', mimetype='model/gltf-binary')
-        else:
+        if not os.path.exists(STATIC_GLB_PATH):
             return jsonify({'error': 'No GLB model available yet'}), 404
+
+        # Re-read only when the file actually changed
+        stat = os.stat(STATIC_GLB_PATH)
+        mtime, etag, data = _glb_cache
+        if stat.st_mtime_ns != mtime:
+            with open(STATIC_GLB_PATH, 'rb') as f:
+                data = f.read()
+            etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+            _glb_cache = (stat.st_mtime_ns, etag, data)
+
+        # Clients that already hold the current model get a bodyless 304
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': etag})
+
+        return Response(data, mimetype='model/gltf-binary', headers={
+            'ETag': etag,
+            'Cache-Control': 'public, max-age=0, must-revalidate'
+        })
     except Exception as e:
         return jsonify({'error': f'Error serving GLB: {str(e)}'}), 500
     
@@ -255,7 +405,7 @@ def download_glb(session_id):
         
         if os.path.exists(glb_path):
             print(f"✅ Sending file: {glb_path}")
-            return send_from_directory(session_model_dir, glb_file, as_attachment=True)
+            return send_file(glb_path, mimetype='model/gltf-binary', as_attachment=True, conditional=True)
         else:
             print(f"❌ GLB file not found at: {glb_path}")
             return jsonify({'error': 'GLB file not found'}), 404
@@ -274,7 +424,7 @@ def stream_glb(session_id):
         glb_path = os.path.join(session_model_dir, glb_file)
         
         if os.path.exists(glb_path):
-            return send_from_directory(session_model_dir, glb_file, mimetype='model/gltf-binary')
+            return send_file(glb_path, mimetype='model/gltf-binary', conditional=True)
         else:
             return jsonify({'error': 'GLB file not found'}), 404
     except Exception as e:
@@ -284,4 +434,7 @@ if __name__ == '__main__':
     print("🌟 Starting Flask server...")
     print(f"📁 Upload folder: {UPLOAD_FOLDER}")
     print(f"📁 Model folder: {MODEL_FOLDER}")
-    app.run(host='0.0.0.0', port=5002, debug=True)
+    # threaded=True so the long generate_glb requests don't block other clients
+    # on the dev server. In production run with multiple gthread workers:
+    #   gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:5002 flask_server:app
+    app.run(host='0.0.0.0', port=5002, debug=True, threaded=True)
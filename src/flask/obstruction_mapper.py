@@ -50,6 +50,11 @@ class ObstructionMapper:
         # Start with everything as not-sky, mark sky pixels as True
         self.sky_grid = np.zeros((self.theta_steps, self.phi_steps), dtype=bool)
         self.sample_counts = np.zeros((self.theta_steps, self.phi_steps), dtype=np.int32)
+
+        # Coverage stats are full-grid reductions - memoize them and only
+        # recompute after the grids actually change
+        self._stats_cache = None
+        self._stats_dirty = True
         
         # Camera intrinsics (approximate for 75° FOV)
         self.focal_length = self.image_width / (2 * math.tan(self.camera_fov_radians / 2))
@@ -59,33 +64,58 @@ class ObstructionMapper:
         print(f"📷 Camera parameters: FOV={self.camera_fov_degrees}°, focal_length={self.focal_length:.1f}")
         print(f"📷 Image center: ({self.cx}, {self.cy})")
 
+        # Precompute the sampled pixel grid and its camera-space directions.
+        # These depend only on the intrinsics, so they are identical for every
+        # photo - per photo, only the rotation changes.
+        self.sample_step = 20  # Sample every 20 pixels
+        vs, us = np.meshgrid(np.arange(0, self.image_height, self.sample_step),
+                             np.arange(0, self.image_width, self.sample_step),
+                             indexing='ij')
+        self._grid_h, self._grid_w = vs.shape
+        self._sample_vs = vs.ravel()
+        self._sample_us = us.ravel()
+        cam_dirs = np.stack([(self._sample_us - self.cx) / self.focal_length,
+                             (self._sample_vs - self.cy) / self.focal_length,
+                             np.ones(self._sample_us.shape[0])], axis=-1)
+        cam_dirs /= np.linalg.norm(cam_dirs, axis=-1, keepdims=True)
+        # float32 holds ~7 significant digits - far beyond what 1-degree
+        # grid cells resolve - at half the memory traffic and twice the
+        # SIMD width of float64
+        cam_dirs = cam_dirs.astype(np.float32)
+        self._cam_dirs = cam_dirs
+        # Contiguous (3,N) copy so the per-photo transform is R @ dirs with
+        # no strided access - the transpose cost is paid once here
+        self._cam_dirs_T = np.ascontiguousarray(cam_dirs.T)
+        # Guard the fast path: both operands must be contiguous float32 for
+        # the matmul to dispatch to BLAS sgemm instead of a strided fallback
+        assert self._cam_dirs.flags['C_CONTIGUOUS'] and self._cam_dirs.dtype == np.float32
+        assert self._cam_dirs_T.flags['C_CONTIGUOUS'] and self._cam_dirs_T.dtype == np.float32
+
+        # Fixed sampling maps for cv2.remap - the SIMD gather path used when
+        # exact single-pixel sampling is wanted instead of the block average
+        self._map_x = us.astype(np.float32)
+        self._map_y = vs.astype(np.float32)
+
+        # For a unit vector, theta <= 60° is exactly z >= cos(60°) - a cheap
+        # compare that rejects out-of-dome rays before any arccos/arctan2
+        self._cos_theta_end = np.float32(math.cos(self.DOME_THETA_END))
+
     def euler_to_rotation_matrix(self, alpha: float, beta: float, gamma: float) -> np.ndarray:
         """
         Convert Euler angles to rotation matrix.
         alpha = yaw (Z-axis), beta = pitch (X-axis), gamma = roll (Y-axis)
         """
-        # Rotation matrices for each axis
-        Rx = np.array([
-            [1, 0, 0],
-            [0, math.cos(beta), -math.sin(beta)],
-            [0, math.sin(beta), math.cos(beta)]
-        ])
-        
-        Ry = np.array([
-            [math.cos(gamma), 0, math.sin(gamma)],
-            [0, 1, 0],
-            [-math.sin(gamma), 0, math.cos(gamma)]
-        ])
-        
-        Rz = np.array([
-            [math.cos(alpha), -math.sin(alpha), 0],
-            [math.sin(alpha), math.cos(alpha), 0],
-            [0, 0, 1]
-        ])
-        
-        # Combined rotation matrix (order: Z-Y-X)
-        R = Rz @ Ry @ Rx
-        return R
+        # Closed-form expansion of Rz @ Ry @ Rx - one array allocation and
+        # no NumPy matmul dispatch instead of three arrays and two matmuls
+        ca, sa = math.cos(alpha), math.sin(alpha)
+        cb, sb = math.cos(beta), math.sin(beta)
+        cg, sg = math.cos(gamma), math.sin(gamma)
+
+        return np.array([
+            [ca * cg, ca * sg * sb - sa * cb, ca * sg * cb + sa * sb],
+            [sa * cg, sa * sg * sb + ca * cb, sa * sg * cb - ca * sb],
+            [-sg, cg * sb, cg * cb]
+        ], dtype=np.float32)
 
     def pixel_to_spherical(self, u: float, v: float, rotation_matrix: np.ndarray) -> Optional[Tuple[float, float]]:
         """
@@ -101,33 +131,40 @@ class ObstructionMapper:
         # Convert pixel to normalized camera coordinates
         x_cam = (u - self.cx) / self.focal_length
         y_cam = (v - self.cy) / self.focal_length
-        z_cam = 1.0
-        
-        # Camera direction vector (normalized)
-        camera_dir = np.array([x_cam, y_cam, z_cam])
-        camera_dir = camera_dir / np.linalg.norm(camera_dir)
-        
-        # Apply rotation to get world coordinates
+
+        # Normalize and rotate with plain scalar math - building np.array
+        # vectors and calling np.linalg.norm per pixel costs more in NumPy
+        # dispatch than the nine multiply-adds themselves
+        inv_norm = 1.0 / math.sqrt(x_cam * x_cam + y_cam * y_cam + 1.0)
+        x = x_cam * inv_norm
+        y = y_cam * inv_norm
+        z = inv_norm
+
         # Rotation matrix transforms from device to world coordinates
-        world_dir = rotation_matrix @ camera_dir
-        
+        R = rotation_matrix
+        world_x = R[0, 0] * x + R[0, 1] * y + R[0, 2] * z
+        world_y = R[1, 0] * x + R[1, 1] * y + R[1, 2] * z
+        world_z = R[2, 0] * x + R[2, 1] * y + R[2, 2] * z
+
         # Convert to spherical coordinates (theta=colatitude, phi=azimuth)
         # theta: angle from north pole (0 to π)
         # phi: azimuthal angle (0 to 2π)
-        
+
         # Ensure we don't get NaN values
-        z_clamped = max(-1.0, min(1.0, world_dir[2]))
-        theta = math.acos(z_clamped)  # Colatitude (0 = north pole, π = south pole)
-        phi = math.atan2(world_dir[1], world_dir[0])  # Azimuthal angle (-π to π)
-        
-        # Normalize phi to 0 to 2π
-        if phi < 0:
-            phi += 2 * math.pi
-            
-        # Check if within dome region (0° to 60° latitude)
-        if theta < self.DOME_THETA_START or theta > self.DOME_THETA_END:
+        z_clamped = max(-1.0, min(1.0, world_z))
+
+        # Check the dome bound on z before spending the transcendentals:
+        # theta <= 60° is equivalent to z >= cos(60°) for a unit vector
+        if z_clamped < self._cos_theta_end:
             return None
-            
+
+        theta = math.acos(z_clamped)  # Colatitude (0 = north pole, π = south pole)
+        phi = math.atan2(world_y, world_x)  # Azimuthal angle (-π to π)
+
+        # Normalize phi to 0 to 2π (branchless - fmod instead of a
+        # data-dependent, ~50%-taken branch)
+        phi = phi % (2 * math.pi)
+
         return (theta, phi)
 
     def spherical_to_grid_indices(self, theta: float, phi: float) -> Optional[Tuple[int, int]]:
@@ -146,69 +183,128 @@ class ObstructionMapper:
             return (theta_idx, phi_idx)
         return None
 
+    def _mask_samples(self, mask: np.ndarray, exact: bool = False) -> np.ndarray:
+        """
+        Reduce the full-resolution mask to one boolean per sample ray.
+
+        One INTER_AREA resize replaces ~19k strided single-byte gathers
+        (each pulling a whole cache line) with a contiguous array that fits
+        in L1, and the block average is a better majority label for the
+        sample_step x sample_step region than a single corner pixel.
+
+        With exact=True the original corner-pixel sampling is reproduced
+        through cv2.remap over precomputed maps - still one SIMD gather
+        pass in C rather than NumPy fancy indexing.
+        """
+        if exact:
+            # The maps hold full-resolution pixel coordinates; rescale them
+            # when the mask was decoded smaller (the disk path uses
+            # IMREAD_REDUCED_GRAYSCALE_4), otherwise remap samples out of
+            # bounds and the constant border silently labels every sample
+            # not-sky
+            map_x, map_y = self._map_x, self._map_y
+            mask_h, mask_w = mask.shape[:2]
+            if (mask_h, mask_w) != (self.image_height, self.image_width):
+                map_x = map_x * np.float32(mask_w / self.image_width)
+                map_y = map_y * np.float32(mask_h / self.image_height)
+            small = cv2.remap(mask, map_x, map_y,
+                              interpolation=cv2.INTER_NEAREST)
+        else:
+            small = cv2.resize(mask, (self._grid_w, self._grid_h),
+                               interpolation=cv2.INTER_AREA)
+        # Row-major ravel matches the (v-major) order of self._cam_dirs
+        return small.ravel() > 128
+
     def process_photo(self, photo_data: Dict, photo_path: str, mask_path: str) -> bool:
         """
         Process a single photo and update the sky grid.
-        
+
         Args:
             photo_data: Photo metadata with rotation data
             photo_path: Path to the photo
             mask_path: Path to the sky mask
-            
+
+        Returns:
+            True if successful, False otherwise
+        """
+        # Load mask
+        if not os.path.exists(mask_path):
+            print(f"⚠️  Mask not found: {mask_path}")
+            return False
+
+        # Decode at quarter resolution - the codec skips the detail it would
+        # otherwise inflate, and _mask_samples resizes down to one value per
+        # sample ray anyway, so full resolution is pure decode waste here
+        mask = cv2.imread(mask_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if mask is None:
+            print(f"❌ Failed to load mask: {mask_path}")
+            return False
+
+        return self.process_photo_arrays(photo_data, mask)
+
+    def process_photo_arrays(self, photo_data: Dict, mask: np.ndarray) -> bool:
+        """
+        Process a single photo's sky mask (already decoded) and update the sky grid.
+
+        Args:
+            photo_data: Photo metadata with rotation data
+            mask: Grayscale sky mask array
+
         Returns:
             True if successful, False otherwise
         """
         try:
-            # Load mask
-            if not os.path.exists(mask_path):
-                print(f"⚠️  Mask not found: {mask_path}")
-                return False
-                
-            mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
-            if mask is None:
-                print(f"❌ Failed to load mask: {mask_path}")
-                return False
-            
             # Get rotation matrix
             alpha = photo_data['alpha']  # yaw
             beta = photo_data['beta']    # pitch
             gamma = photo_data['gamma']  # roll
             rotation_matrix = self.euler_to_rotation_matrix(alpha, beta, gamma)
-            
-            # Sample pixels in a grid pattern for efficiency
-            sample_step = 20  # Sample every 20 pixels
-            pixels_processed = 0
-            pixels_mapped = 0
-            sky_pixels_found = 0
-            
-            for v in range(0, self.image_height, sample_step):
-                for u in range(0, self.image_width, sample_step):
-                    pixels_processed += 1
-                    
-                    # Convert pixel to spherical coordinates
-                    spherical_coords = self.pixel_to_spherical(u, v, rotation_matrix)
-                    if spherical_coords is None:
-                        continue
-                        
-                    theta, phi = spherical_coords
-                    grid_indices = self.spherical_to_grid_indices(theta, phi)
-                    if grid_indices is None:
-                        continue
-                        
-                    pixels_mapped += 1
-                    theta_idx, phi_idx = grid_indices
-                    
-                    # Get mask value at this pixel
-                    mask_value = mask[v, u]
-                    
-                    # Increment sample count for this cell
-                    self.sample_counts[theta_idx, phi_idx] += 1
-                    
-                    # If this pixel is sky (white in mask), mark the cell as sky
-                    if mask_value > 128:  # Sky (white in mask)
-                        self.sky_grid[theta_idx, phi_idx] = True
-                        sky_pixels_found += 1
-            
+
+            # Threshold the mask once, up front - one contiguous SIMD compare
+            # over the downsampled mask; everything after deals in booleans
+            sky_samples = self._mask_samples(mask)
+
+            # Rotate all sampled camera directions into world space in one
+            # matmul, then derive spherical coordinates with array ops -
+            # this replaces ~19k Python-level pixel_to_spherical calls.
+            # (3,N) output keeps each component contiguous for the trig below.
+            world = rotation_matrix @ self._cam_dirs_T
+
+            # Early-reject rays below the dome with one compare on z, so the
+            # transcendentals only run on the surviving subset
+            z = world[2]
+            in_dome = np.flatnonzero(z >= self._cos_theta_end)
+
+            theta = np.arccos(np.clip(z[in_dome], -1.0, 1.0))
+            phi = np.arctan2(world[1, in_dome], world[0, in_dome])
+            phi %= 2 * math.pi  # branchless wrap of atan2's (-pi, pi] into [0, 2pi)
+
+            theta_idx = ((theta - self.DOME_THETA_START) / self.grid_resolution_radians).astype(np.intp)
+            phi_idx = ((phi - self.DOME_PHI_START) / self.grid_resolution_radians).astype(np.intp)
+
+            in_grid = (theta_idx < self.theta_steps) & (phi_idx < self.phi_steps)
+            theta_idx = theta_idx[in_grid]
+            phi_idx = phi_idx[in_grid]
+
+            # Look up the pre-thresholded samples at the mapped rays
+            mapped = in_dome[in_grid]
+            sky = sky_samples[mapped]
+
+            # Accumulate through linear indices: np.bincount is a tight C
+            # histogram loop, where np.add.at degrades to a slow buffered
+            # scatter when cell indices repeat (and they always do here)
+            lin = theta_idx * self.phi_steps + phi_idx
+            n_cells = self.theta_steps * self.phi_steps
+            self.sample_counts += np.bincount(lin, minlength=n_cells).reshape(
+                self.theta_steps, self.phi_steps).astype(np.int32)
+            self.sky_grid |= np.bincount(lin[sky], minlength=n_cells).reshape(
+                self.theta_steps, self.phi_steps) > 0
+            self._stats_dirty = True
+
+            pixels_processed = self._cam_dirs.shape[0]
+            pixels_mapped = int(theta_idx.shape[0])
+            sky_pixels_found = int(np.count_nonzero(sky))
+
             coverage_percent = (pixels_mapped / pixels_processed) * 100 if pixels_processed > 0 else 0
             sky_percent = (sky_pixels_found / pixels_mapped) * 100 if pixels_mapped > 0 else 0
             
@@ -220,15 +316,101 @@ class ObstructionMapper:
             print(f"❌ Error processing photo {photo_data.get('index', 'unknown')}: {e}")
             return False
 
+    def process_photo_batch(self, photos: List[Dict], masks: List[np.ndarray]) -> int:
+        """
+        Process several photos' sky masks in one batched transform.
+
+        The camera directions are shared across photos - only the rotation
+        differs - so all P rotations run as a single (P,3,3) x (3,N) batched
+        matmul and the spherical math covers the whole (P,N) plane at once.
+
+        Args:
+            photos: Photo metadata dicts with rotation data
+            masks: Grayscale sky mask arrays, matching photos order
+
+        Returns:
+            Number of photos processed
+        """
+        if len(photos) == 0:
+            return 0
+
+        # Process large sessions in fixed-size blocks so the (P,3,N) world
+        # tensor and (P,N) planes stay cache-sized. Each block builds its
+        # private bincount partials and reduces them into the shared grids -
+        # same scratch-then-reduce structure as tile threading, without the
+        # thread overhead (the matmul is already BLAS-parallel).
+        block = 16
+        if len(photos) > block:
+            processed = 0
+            for start in range(0, len(photos), block):
+                processed += self.process_photo_batch(photos[start:start + block],
+                                                      masks[start:start + block])
+            return processed
+
+        try:
+            R_all = np.stack([self.euler_to_rotation_matrix(p['alpha'], p['beta'], p['gamma'])
+                              for p in photos])
+
+            # (P,3,3) @ (3,N) -> (P,3,N) in one batched GEMM
+            world = np.matmul(R_all, self._cam_dirs_T)
+
+            # Early-reject on z across the whole (P,N) plane before the
+            # transcendentals, keeping (photo, sample) index pairs
+            z = world[:, 2, :]
+            photo_idx, sample_idx = np.nonzero(z >= self._cos_theta_end)
+
+            theta = np.arccos(np.clip(z[photo_idx, sample_idx], -1.0, 1.0))
+            phi = np.arctan2(world[photo_idx, 1, sample_idx],
+                             world[photo_idx, 0, sample_idx])
+            phi %= 2 * math.pi  # branchless wrap of atan2's (-pi, pi] into [0, 2pi)
+
+            theta_idx = ((theta - self.DOME_THETA_START) / self.grid_resolution_radians).astype(np.intp)
+            phi_idx = ((phi - self.DOME_PHI_START) / self.grid_resolution_radians).astype(np.intp)
+
+            in_grid = (theta_idx < self.theta_steps) & (phi_idx < self.phi_steps)
+            photo_idx = photo_idx[in_grid]
+            sample_idx = sample_idx[in_grid]
+
+            # Downsample each mask once; one contiguous row per photo
+            sky_vals = np.stack([self._mask_samples(m) for m in masks])
+            sky = sky_vals[photo_idx, sample_idx]
+
+            # Same bincount accumulation as the per-photo path, over the
+            # flattened samples of every photo at once
+            lin = theta_idx[in_grid] * self.phi_steps + phi_idx[in_grid]
+            n_cells = self.theta_steps * self.phi_steps
+            self.sample_counts += np.bincount(lin, minlength=n_cells).reshape(
+                self.theta_steps, self.phi_steps).astype(np.int32)
+            self.sky_grid |= np.bincount(lin[sky], minlength=n_cells).reshape(
+                self.theta_steps, self.phi_steps) > 0
+            self._stats_dirty = True
+
+            mapped_per_photo = np.bincount(photo_idx, minlength=len(photos))
+            sky_per_photo = np.bincount(photo_idx[sky], minlength=len(photos))
+            pixels_processed = self._cam_dirs.shape[0]
+            for photo_data, mapped, sky_found in zip(photos, mapped_per_photo, sky_per_photo):
+                coverage_percent = (mapped / pixels_processed) * 100 if pixels_processed > 0 else 0
+                sky_percent = (sky_found / mapped) * 100 if mapped > 0 else 0
+                print(f"📸 Photo {photo_data['index']}: {mapped}/{pixels_processed} pixels mapped ({coverage_percent:.1f}%), {sky_found} sky pixels ({sky_percent:.1f}%)")
+
+            return len(photos)
+
+        except Exception as e:
+            print(f"❌ Error processing photo batch: {e}")
+            return 0
+
     def get_coverage_statistics(self) -> Dict:
         """Get statistics about grid coverage."""
+        if not self._stats_dirty and self._stats_cache is not None:
+            return self._stats_cache
+
         total_cells = self.theta_steps * self.phi_steps
         sampled_cells = np.sum(self.sample_counts > 0)
         sky_cells = np.sum(self.sky_grid)
         not_sky_cells = sampled_cells - sky_cells
         unsampled_cells = total_cells - sampled_cells
         
-        return {
+        self._stats_cache = {
             'total_cells': total_cells,
             'sampled_cells': sampled_cells,
             'sky_cells': sky_cells,
@@ -239,6 +421,8 @@ class ObstructionMapper:
             'not_sky_percent': (not_sky_cells / sampled_cells) * 100 if sampled_cells > 0 else 0,
             'unsampled_percent': (unsampled_cells / total_cells) * 100
         }
+        self._stats_dirty = False
+        return self._stats_cache
 
     def save_obstruction_map(self, output_dir: str) -> str:
         """
@@ -248,11 +432,18 @@ class ObstructionMapper:
             Path to saved file
         """
         os.makedirs(output_dir, exist_ok=True)
-        
-        # Convert grid to list for JSON serialization
-        sky_grid_data = self.sky_grid.tolist()
-        sample_counts_data = self.sample_counts.tolist()
-        
+
+        # The grids go into a compressed binary archive: one bit per sky
+        # cell and uint16 counts, instead of ~44k Python objects rendered
+        # as indented JSON text
+        grids_path = os.path.join(output_dir, "grids.npz")
+        np.savez_compressed(
+            grids_path,
+            sky_bits=np.packbits(self.sky_grid),
+            sky_shape=np.array(self.sky_grid.shape),
+            counts=self.sample_counts.astype(np.uint16)
+        )
+
         # Create metadata
         metadata = {
             "coordinate_system": "spherical_dome_0_to_60_degrees",
@@ -278,91 +469,109 @@ class ObstructionMapper:
             "color_scheme": {
                 "sky": "blue",
                 "not_sky": "red"
+            },
+            "grids_file": "grids.npz",
+            "grids_format": {
+                "sky_bits": "np.packbits of the boolean sky grid; unpack with np.unpackbits(sky_bits)[:n].reshape(sky_shape).astype(bool)",
+                "counts": "uint16 sample counts, grid_dimensions shape"
             }
         }
-        
-        # Save obstruction map
-        map_data = {
-            "sky_grid": sky_grid_data,
-            "sample_counts": sample_counts_data,
-            "metadata": metadata
-        }
-        
+
+        # The JSON file now carries only the small metadata dict
         output_path = os.path.join(output_dir, "dome_sky_map.json")
         with open(output_path, 'w') as f:
-            json.dump(map_data, f, indent=2)
-            
-        print(f"💾 Dome sky map saved: {output_path}")
+            json.dump(metadata, f, indent=2)
+
+        print(f"💾 Dome sky map saved: {output_path} (grids in {grids_path})")
         return output_path
 
+    def _build_mesh(self) -> trimesh.Trimesh:
+        """Build the colored dome mesh from the sky map."""
+        # Dome radius for 3D model
+        radius = 50.0
+
+        # Generate vertices for the spherical dome (0° to 60° latitude) on
+        # the full index grid at once - theta: colatitude (0 = north pole),
+        # phi: azimuth (0 to 2π)
+        # Build x/y/z as separate float32 planes (SoA) - half the bytes of
+        # the default float64, and GLB stores float32 anyway so nothing is
+        # lost casting early
+        theta = (self.DOME_THETA_START + np.arange(self.theta_steps) * self.grid_resolution_radians).astype(np.float32)
+        phi = (self.DOME_PHI_START + np.arange(self.phi_steps) * self.grid_resolution_radians).astype(np.float32)
+        theta, phi = np.meshgrid(theta, phi, indexing='ij')
+
+        sin_theta = np.sin(theta)
+        x = np.empty_like(sin_theta)
+        y = np.empty_like(sin_theta)
+        np.multiply(sin_theta, np.cos(phi), out=x)
+        np.multiply(sin_theta, np.sin(phi), out=y)
+        z = np.cos(theta)
+        x *= radius
+        y *= radius
+        z *= radius
+
+        vertices = np.stack([x.ravel(), y.ravel(), z.ravel()], axis=1)
+
+        # Color based on sky classification - ALL WITH 50% TRANSPARENCY.
+        # Unsampled gray is the default; sampled cells get overwritten.
+        colors = np.full((self.theta_steps, self.phi_steps, 4), 128, dtype=np.uint8)
+        sampled = self.sample_counts > 0
+        colors[sampled & self.sky_grid] = [0, 0, 255, 128]    # Sky: blue
+        colors[sampled & ~self.sky_grid] = [255, 0, 0, 128]   # Not sky: red
+        colors = colors.reshape(-1, 4)
+
+        # Generate faces (two triangles per grid quad) from index grids
+        i, j = np.meshgrid(np.arange(self.theta_steps - 1),
+                           np.arange(self.phi_steps - 1), indexing='ij')
+        v0 = i * self.phi_steps + j
+        v1 = i * self.phi_steps + (j + 1)
+        v2 = (i + 1) * self.phi_steps + j
+        v3 = (i + 1) * self.phi_steps + (j + 1)
+
+        faces = np.empty((self.theta_steps - 1, self.phi_steps - 1, 2, 3), dtype=np.int64)
+        faces[..., 0, :] = np.stack([v0, v1, v2], axis=-1)
+        faces[..., 1, :] = np.stack([v1, v3, v2], axis=-1)
+        faces = faces.reshape(-1, 3)
+
+        # Create mesh. The dome is generated analytically so trimesh's
+        # cleanup pass (duplicate-vertex merge, winding fix) has nothing to
+        # repair - process=False skips those full-mesh sweeps
+        return trimesh.Trimesh(
+            vertices=vertices,
+            faces=faces,
+            vertex_colors=colors,
+            process=False
+        )
+
+    def export_glb_bytes(self) -> bytes:
+        """
+        Build the dome mesh from the sky map and return it as GLB bytes.
+
+        Returns:
+            GLB file contents
+        """
+        return self._build_mesh().export(file_type="glb")
+
     def generate_3d_model(self, output_dir: str) -> str:
         """
-        Generate a 3D model from the sky map.
-        
+        Generate a 3D model from the sky map and save it to disk.
+
         Returns:
             Path to saved model file
         """
         os.makedirs(output_dir, exist_ok=True)
-        
-        vertices = []
-        faces = []
-        colors = []
-        
-        # Dome radius for 3D model
-        radius = 50.0
-        
-        # Generate vertices for the spherical dome (0° to 60° latitude)
-        for i in range(self.theta_steps):
-            for j in range(self.phi_steps):
-                theta = self.DOME_THETA_START + i * self.grid_resolution_radians
-                phi = self.DOME_PHI_START + j * self.grid_resolution_radians
-                
-                # Convert to Cartesian coordinates
-                # theta: colatitude (0 = north pole)
-                # phi: azimuth (0 to 2π)
-                x = radius * math.sin(theta) * math.cos(phi)
-                y = radius * math.sin(theta) * math.sin(phi)
-                z = radius * math.cos(theta)
-                
-                vertices.append([x, y, z])
-                
-                # Color based on sky classification - ALL WITH 50% TRANSPARENCY
-                is_sky = self.sky_grid[i, j]
-                sample_count = self.sample_counts[i, j]
-                
-                if sample_count > 0:  # Sampled area
-                    if is_sky:  # Sky
-                        colors.append([0, 0, 255, 128])  # Blue, 50% transparent
-                    else:  # Not sky
-                        colors.append([255, 0, 0, 128])  # Red, 50% transparent
-                else:  # Unsampled
-                    colors.append([128, 128, 128, 128])  # Gray, 50% transparent
-        
-        # Generate faces (triangles)
-        for i in range(self.theta_steps - 1):
-            for j in range(self.phi_steps - 1):
-                # Current quad vertices
-                v0 = i * self.phi_steps + j
-                v1 = i * self.phi_steps + ((j + 1) % self.phi_steps)
-                v2 = (i + 1) * self.phi_steps + j
-                v3 = (i + 1) * self.phi_steps + ((j + 1) % self.phi_steps)
-                
-                # Two triangles per quad
-                faces.append([v0, v1, v2])
-                faces.append([v1, v3, v2])
-        
-        # Create mesh
-        mesh = trimesh.Trimesh(
-            vertices=np.array(vertices),
-            faces=np.array(faces),
-            vertex_colors=np.array(colors)
-        )
-        
-        # Save as PLY file
+
+        # Write-then-rename so a viewer polling the model never reads a
+        # partially written GLB. The export streams straight into the temp
+        # file - no intermediate bytes object held alongside the buffers.
         output_path = os.path.join(output_dir, "dome_sky_model.glb")
-        with open(output_path, "wb") as f:
-            f.write(mesh.export(file_type="glb"))
-        
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            self._build_mesh().export(file_obj=f, file_type="glb")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+
         print(f"🎨 3D dome model saved: {output_path} (all colors with 50% transparency)")
         return output_path
 
@@ -376,21 +585,12 @@ class ObstructionMapper:
         """
         os.makedirs(output_dir, exist_ok=True)
         
-        # Create RGBA image from sky grid
-        texture_data = np.zeros((self.theta_steps, self.phi_steps, 4), dtype=np.uint8)
-        
-        for i in range(self.theta_steps):
-            for j in range(self.phi_steps):
-                sample_count = self.sample_counts[i, j]
-                
-                if sample_count > 0:  # Sampled area
-                    is_sky = self.sky_grid[i, j]
-                    if is_sky:  # Sky
-                        texture_data[i, j] = [0, 0, 255, 128]  # Blue with 50% transparency
-                    else:  # Not sky
-                        texture_data[i, j] = [255, 0, 0, 128]  # Red with 50% transparency
-                else:  # Unsampled
-                    texture_data[i, j] = [128, 128, 128, 128]  # Gray with 50% transparency
+        # Create RGBA image from sky grid with boolean-mask assignment -
+        # unsampled gray is the default, sampled cells get overwritten
+        texture_data = np.full((self.theta_steps, self.phi_steps, 4), 128, dtype=np.uint8)
+        sampled = self.sample_counts > 0
+        texture_data[sampled & self.sky_grid] = [0, 0, 255, 128]   # Blue with 50% transparency
+        texture_data[sampled & ~self.sky_grid] = [255, 0, 0, 128]  # Red with 50% transparency
 
         # Save as PNG
         output_path = os.path.join(output_dir, "dome_sky_texture.png")
@@ -3,8 +3,11 @@ import numpy as np
 import json
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from lab1 import process_single_photo
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from lab1 import process_single_photo, get_sky_mask
 from obstruction_mapper import ObstructionMapper
 import math
 
@@ -40,24 +43,46 @@ def load_rotation_data(rotation_json_path):
         print(f"❌ Error loading rotation data: {e}")
         return None
 
-def process_all_photos_parallel(rotation_data, photos_dir="./photos", masks_dir="./masks", max_workers=4):
+def _init_mask_worker():
+    """Pin OpenCV to one thread inside each pool worker.
+
+    The pool already saturates the cores, so OpenCV's internal threading
+    would only oversubscribe them.
+    """
+    cv2.setNumThreads(1)
+
+def process_all_photos_parallel(rotation_data, photos_dir="./photos", masks_dir="./masks", max_workers=None, use_threads=False):
     """
     Process all photos in parallel to generate masks.
-    
+
     Parameters:
     - rotation_data: List of photo data from rotation.json
     - photos_dir: Directory containing photos
     - masks_dir: Directory to save masks
-    - max_workers: Maximum number of parallel workers
-    
+    - max_workers: Maximum number of parallel workers (defaults to CPU count)
+    - use_threads: Use a thread pool instead of processes (for I/O-bound runs
+      such as network-mounted photo directories)
+
     Returns:
     - results: Dictionary with success/failure counts
     """
     results = {"success": 0, "failed": 0, "total": len(rotation_data)}
-    
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 4
+
     print(f"🚀 Starting parallel processing of {results['total']} photos with {max_workers} workers...")
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+    # Each photo runs in its own interpreter, so the Python-level parts of
+    # process_single_photo (path handling, stats, prints) parallelize too
+    # instead of serializing on the GIL between cv2 calls. Threads remain
+    # available for runs dominated by read/write latency rather than CPU.
+    # The dome grids deliberately stay out of these workers: masks go to
+    # disk here and the mapper accumulates them in one batched pass later,
+    # so there is no per-photo result to merge and nothing to gain from
+    # backing the grids with shared memory.
+    executor_cls = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with executor_cls(max_workers=max_workers, initializer=_init_mask_worker) as executor:
         # Submit all tasks
         future_to_photo = {
             executor.submit(process_single_photo, photo_data, photos_dir, masks_dir): photo_data
@@ -83,7 +108,7 @@ def process_all_photos_parallel(rotation_data, photos_dir="./photos", masks_dir=
             except Exception as e:
                 print(f"❌ Exception processing photo {photo_data.get('index', 'unknown')}: {e}")
                 results["failed"] += 1
-    
+
     return results
 
 def process_dome_mapping(rotation_data, photos_dir="./photos", masks_dir="./masks", 
@@ -113,29 +138,61 @@ def process_dome_mapping(rotation_data, photos_dir="./photos", masks_dir="./mask
     print(f"📊 Target area: 0° to 60° latitude (north pole dome)")
     print(f"📊 Grid resolution: {grid_resolution}° ({mapper.theta_steps} x {mapper.phi_steps} cells)")
     
-    # Process each photo
+    # Process each photo. Mask reads are prefetched by a small thread pool
+    # into a bounded queue so disk latency overlaps the geometry instead of
+    # stalling it; the queue bound caps how many decoded masks sit in memory.
+    # Resolve every mask path up front - one pass of string work instead of
+    # re-joining inside the per-photo loop
+    mask_paths = [
+        (photo_data, os.path.join(masks_dir, f"{photo_data.get('index', 'unknown')}.jpg"))
+        for photo_data in rotation_data
+    ]
+
+    def read_mask(entry):
+        photo_data, mask_path = entry
+        if not os.path.exists(mask_path):
+            print(f"⚠️  Mask not found: {mask_path}")
+            return photo_data, None
+        mask = cv2.imread(mask_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if mask is None:
+            print(f"❌ Failed to load mask: {mask_path}")
+        return photo_data, mask
+
+    prefetch_queue = queue.Queue(maxsize=8)
+
+    def prefetch():
+        # Submit at most a queue's worth of reads ahead - Executor.map
+        # would eagerly decode every mask into completed futures, so the
+        # queue bound alone would not cap memory
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            window = deque()
+            for entry in mask_paths:
+                window.append(pool.submit(read_mask, entry))
+                if len(window) >= prefetch_queue.maxsize:
+                    prefetch_queue.put(window.popleft().result())
+            while window:
+                prefetch_queue.put(window.popleft().result())
+        prefetch_queue.put(None)
+
+    threading.Thread(target=prefetch, daemon=True).start()
+
     processed_photos = 0
     successful_photos = 0
-    
-    for photo_data in rotation_data:
-        photo_index = photo_data.get('index', 'unknown')
-        
-        # Get photo path from photoUri
-        photo_filename = os.path.basename(photo_data['photoUri'])
-        photo_path = os.path.join(photos_dir, photo_filename)
-        
-        # Get corresponding mask path
-        mask_filename = f"{photo_index}.jpg"
-        mask_path = os.path.join(masks_dir, mask_filename)
-        
-        # Process this photo
-        if mapper.process_photo(photo_data, photo_path, mask_path):
+
+    while True:
+        item = prefetch_queue.get()
+        if item is None:
+            break
+        photo_data, mask = item
+
+        # Accumulate into the shared dome grids on the main thread
+        if mask is not None and mapper.process_photo_arrays(photo_data, mask):
             successful_photos += 1
-        
+
         processed_photos += 1
         
-        # Print progress every 3 photos or at the end
-        if processed_photos % 3 == 0 or processed_photos == len(rotation_data):
+        # Print progress every 10 photos or at the end
+        if processed_photos % 10 == 0 or processed_photos == len(rotation_data):
             progress = (processed_photos / len(rotation_data)) * 100
             print(f"🗺️  Mapping progress: {progress:.1f}% ({processed_photos}/{len(rotation_data)})")
             
@@ -165,6 +222,56 @@ def process_dome_mapping(rotation_data, photos_dir="./photos", masks_dir="./mask
     
     return mapper
 
+def process_photos(photo_data, images):
+    """
+    Run mask generation and dome mapping fully in memory.
+
+    Parameters:
+    - photo_data: List of photo metadata dicts (rotation.json entries)
+    - images: List of decoded BGR arrays or encoded image bytes, matching photo_data order
+
+    Returns:
+    - GLB bytes for the generated dome model
+    """
+    mapper = ObstructionMapper(grid_resolution_degrees=1.0)
+
+    def decode_and_mask(image):
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        return get_sky_mask(image)
+
+    # Mask generation is independent per photo and OpenCV releases the GIL,
+    # so threads give real parallelism here; cap OpenCV's own threading to
+    # one thread per worker to avoid oversubscription
+    previous_cv_threads = cv2.getNumThreads()
+    cv2.setNumThreads(1)
+    try:
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+            masks = list(executor.map(decode_and_mask, images))
+    finally:
+        cv2.setNumThreads(previous_cv_threads)
+
+    batch_photos = []
+    batch_masks = []
+    for photo, mask in zip(photo_data, masks):
+        if mask is None:
+            print(f"❌ Failed to decode photo {photo.get('index', 'unknown')}")
+            continue
+        batch_photos.append(photo)
+        batch_masks.append(mask)
+
+    # One batched transform over all photos instead of a per-photo loop
+    processed = mapper.process_photo_batch(batch_photos, batch_masks)
+
+    print(f"📸 Processed {processed}/{len(photo_data)} photos in memory")
+
+    stats = mapper.get_coverage_statistics()
+    print(f"📊 Sampled: {stats['coverage_percent']:.1f}% | Sky: {stats['sky_percent']:.1f}% | Not-sky: {stats['not_sky_percent']:.1f}%")
+
+    return mapper.export_glb_bytes()
+
 def main(rotation_json_path):
     """Main function to process all photos from rotation.json"""
     
@@ -9,10 +9,32 @@ import numpy as np
 import os
 import sys
 import json
+import logging
+import queue
+import shutil
+import subprocess
+import threading
 from pathlib import Path
 from typing import Optional, List, Tuple, Dict
 import math
 
+log = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib parser
+    orjson = None
+
+try:
+    import av
+except ImportError:  # PyAV is optional - fall back to cv2.VideoCapture
+    av = None
+
+# Route the per-frame image ops through OpenCV's transparent OpenCL path
+# (UMat) when a device is available - resize/cvtColor/Canny all have T-API
+# kernels, which moves that work off the CPU cores doing decode/encode
+_USE_OPENCL = cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
 class RotationDataProcessor:
     """Handles rotation data synchronization and processing"""
     
@@ -20,7 +42,13 @@ class RotationDataProcessor:
         self.rotation_data = []
         self.video_fps = 30
         self.sync_offset = 0  # milliseconds
-        
+
+        # Sorted per-axis arrays for O(log N) frame lookups
+        self._ts = np.empty(0, dtype=np.float64)
+        self._roll = np.empty(0, dtype=np.float64)
+        self._pitch = np.empty(0, dtype=np.float64)
+        self._yaw = np.empty(0, dtype=np.float64)
+
         if rotation_data_path:
             self.load_rotation_data(rotation_data_path)
     
@@ -29,56 +57,95 @@ class RotationDataProcessor:
         # Expected format: [{"timestamp": ms, "alpha": rad, "beta": rad, "gamma": rad}, ...]
         # alpha = yaw (Z-axis), beta = pitch (X-axis), gamma = roll (Y-axis)
         try:
-            with open(path, 'r') as f:
-                raw_data = json.load(f)
-            
-            # Convert from alpha/beta/gamma (radians) to roll/pitch/yaw (degrees)
-            self.rotation_data = []
-            for entry in raw_data:
-                converted_entry = {
-                    "timestamp": entry["timestamp"],
-                    "roll": math.degrees(entry["gamma"]),    # gamma -> roll
-                    "pitch": math.degrees(entry["beta"]),    # beta -> pitch
-                    "yaw": math.degrees(entry["alpha"])      # alpha -> yaw
-                }
-                self.rotation_data.append(converted_entry)
+            # orjson parses large rotation logs several times faster than
+            # the stdlib; both take the raw bytes
+            with open(path, 'rb') as f:
+                data = f.read()
+            raw_data = orjson.loads(data) if orjson is not None else json.loads(data)
             
-            print(f"Loaded {len(self.rotation_data)} rotation data points")
-            print(f"Time range: {self.rotation_data[0]['timestamp']} to {self.rotation_data[-1]['timestamp']} ms")
+            # Convert from alpha/beta/gamma (radians) to roll/pitch/yaw
+            # (degrees) in one vectorized pass per axis - np.degrees over a
+            # contiguous array instead of three math.degrees calls per entry
+            n = len(raw_data)
+            ts = np.fromiter((e["timestamp"] for e in raw_data), dtype=np.float64, count=n)
+            roll = np.degrees(np.fromiter((e["gamma"] for e in raw_data), dtype=np.float64, count=n))    # gamma -> roll
+            pitch = np.degrees(np.fromiter((e["beta"] for e in raw_data), dtype=np.float64, count=n))    # beta -> pitch
+            yaw = np.degrees(np.fromiter((e["alpha"] for e in raw_data), dtype=np.float64, count=n))     # alpha -> yaw
+
+            # Sorted parallel arrays so per-frame lookups can binary search
+            # instead of scanning the whole list every frame
+            order = np.argsort(ts, kind='stable')
+            self._ts = ts[order]
+            self._roll = roll[order]
+            self._pitch = pitch[order]
+            self._yaw = yaw[order]
+
+            # Keep the dict list for code that still reads it directly
+            self.rotation_data = [
+                {"timestamp": t, "roll": r, "pitch": p, "yaw": y}
+                for t, r, p, y in zip(ts.tolist(), roll.tolist(), pitch.tolist(), yaw.tolist())
+            ]
+
+            log.info(f"Loaded {len(self.rotation_data)} rotation data points")
+            log.info(f"Time range: {self.rotation_data[0]['timestamp']} to {self.rotation_data[-1]['timestamp']} ms")
         except Exception as e:
-            print(f"Error loading rotation data: {e}")
+            log.error(f"Error loading rotation data: {e}")
     
-    def get_rotation_for_frame(self, frame_number: int) -> Dict[str, float]:
-        """Get rotation data for specific frame number"""
+    def get_rotation_for_frame(self, frame_number: int) -> Tuple[float, float, float]:
+        """Get (roll, pitch, yaw) in degrees for a specific frame number"""
         if not self.rotation_data:
-            return {"roll": 0, "pitch": 0, "yaw": 0}
+            return (0.0, 0.0, 0.0)
         
         # Convert frame number to timestamp
         video_timestamp_ms = (frame_number / self.video_fps) * 1000
         target_timestamp = video_timestamp_ms + self.sync_offset
         
-        # Find closest rotation data point
-        closest_idx = 0
-        min_diff = float('inf')
-        
-        for i, data in enumerate(self.rotation_data):
-            diff = abs(data['timestamp'] - target_timestamp)
-            if diff < min_diff:
-                min_diff = diff
-                closest_idx = i
-        
-        rotation = self.rotation_data[closest_idx]
-        
-        # Debug output for first few frames
-        if frame_number < 5:
-            print(f"Frame {frame_number}: video_time={video_timestamp_ms:.1f}ms, "
-                  f"target_time={target_timestamp:.1f}ms, "
-                  f"matched_time={rotation['timestamp']:.1f}ms, "
-                  f"diff={min_diff:.1f}ms")
-            print(f"  Roll: {rotation['roll']:.1f}°, Pitch: {rotation['pitch']:.1f}°, Yaw: {rotation['yaw']:.1f}°")
-        
-        return rotation
-    
+        # Binary search the sorted timestamps for the nearest sample - one
+        # C-level bisect instead of a Python scan over every data point
+        idx = int(np.searchsorted(self._ts, target_timestamp))
+        if idx >= len(self._ts):
+            idx = len(self._ts) - 1
+        elif idx > 0 and abs(self._ts[idx - 1] - target_timestamp) <= abs(self._ts[idx] - target_timestamp):
+            idx -= 1
+
+        roll = float(self._roll[idx])
+        pitch = float(self._pitch[idx])
+        yaw = float(self._yaw[idx])
+
+        # Per-frame matching detail only when debug logging is on - the
+        # f-strings are not even built otherwise
+        if frame_number < 5 and log.isEnabledFor(logging.DEBUG):
+            min_diff = abs(self._ts[idx] - target_timestamp)
+            log.debug(f"Frame {frame_number}: video_time={video_timestamp_ms:.1f}ms, "
+                      f"target_time={target_timestamp:.1f}ms, "
+                      f"matched_time={self._ts[idx]:.1f}ms, "
+                      f"diff={min_diff:.1f}ms")
+            log.debug(f"  Roll: {roll:.1f}°, Pitch: {pitch:.1f}°, Yaw: {yaw:.1f}°")
+
+        return (roll, pitch, yaw)
+
+    def precompute_frame_rotations(self, total_frames: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Resolve (roll, pitch, yaw) arrays for every frame index in one pass.
+
+        One vectorized searchsorted over all frame timestamps replaces
+        total_frames separate lookups; each result matches what
+        get_rotation_for_frame would return for that frame.
+        """
+        if not self.rotation_data or total_frames <= 0:
+            zeros = np.zeros(max(total_frames, 0), dtype=np.float64)
+            return zeros, zeros.copy(), zeros.copy()
+
+        targets = np.arange(total_frames, dtype=np.float64) / self.video_fps * 1000.0 + self.sync_offset
+        raw = np.searchsorted(self._ts, targets)
+        idx = np.minimum(raw, len(self._ts) - 1)
+        prev = np.maximum(idx - 1, 0)
+        # Same nearer-neighbor rule as the scalar lookup
+        step_back = (raw < len(self._ts)) & (idx > 0) & \
+            (np.abs(self._ts[prev] - targets) <= np.abs(self._ts[idx] - targets))
+        idx = np.where(step_back, prev, idx)
+        return self._roll[idx], self._pitch[idx], self._yaw[idx]
+
     def auto_sync_with_video(self, video_path: str):
         """Attempt to automatically sync rotation data with video"""
         if not self.rotation_data:
@@ -89,13 +156,13 @@ class RotationDataProcessor:
         end_time = self.rotation_data[-1]["timestamp"]
         duration_ms = end_time - start_time
         
-        print(f"Rotation data duration: {duration_ms/1000:.1f} seconds")
+        log.info(f"Rotation data duration: {duration_ms/1000:.1f} seconds")
         
         # For now, assume video starts at the beginning of rotation data
         # This would need refinement based on actual video start time
         self.sync_offset = -start_time  # Normalize timestamps to start at 0
         
-        print(f"Applied auto-sync offset: {self.sync_offset}ms")
+        log.info(f"Applied auto-sync offset: {self.sync_offset}ms")
 
 class AdvancedDomeConverter:
     def __init__(self, input_path: str, output_path: str, rotation_processor: Optional[RotationDataProcessor] = None):
@@ -108,161 +175,234 @@ class AdvancedDomeConverter:
         self.sky_roi_top = 0.3  # Top 30% of frame assumed to be sky
         self.horizon_detection_enabled = True
         
-        # Stabilization parameters
+        # Stabilization parameters. Accumulated smoothing state lives in
+        # three floats - no per-frame dict key traffic
         self.stabilization_enabled = True
-        self.accumulated_rotation = {"roll": 0, "pitch": 0, "yaw": 0}
-        
+        self._acc_roll = 0.0
+        self._acc_pitch = 0.0
+        self._acc_yaw = 0.0
+
+        # Dome remap tables cached per sky-frame shape - the mapping only
+        # depends on dome_size and the source dimensions, not on the frame
+        self._remap_cache = {}
+
+        # Prefer piping raw frames to ffmpeg/libx264 (multi-threaded) over
+        # cv2.VideoWriter's single-threaded mp4v encoder when available
+        self.use_ffmpeg = True
+
     def detect_horizon(self, frame: np.ndarray) -> int:
         """Detect horizon line in frame"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        height, width = gray.shape
-        
+        # The horizon is a low-frequency feature - Canny and Hough cost
+        # scale with pixel count, so run them at quarter resolution and
+        # scale the detected row back up
+        scale = 4
+        src = cv2.UMat(frame) if _USE_OPENCL else frame
+        small = cv2.resize(src, None, fx=1.0 / scale, fy=1.0 / scale,
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
         # Use edge detection to find horizon
         edges = cv2.Canny(gray, 50, 150)
-        
+        if _USE_OPENCL:
+            edges = edges.get()
+        height, width = edges.shape
+
         # Find horizontal lines using Hough transform
         lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=int(width*0.3))
         
         if lines is not None:
-            # Find the most horizontal line in the middle portion of the image
-            best_y = height // 2
-            best_score = 0
-            
-            for line in lines:
-                rho, theta = line[0]
-                # Check if line is roughly horizontal
-                if abs(theta - np.pi/2) < 0.2:  # Within ~11 degrees of horizontal
-                    y = rho / np.sin(theta) if np.sin(theta) != 0 else height // 2
-                    if height * 0.2 < y < height * 0.8:  # In middle 60% of frame
-                        score = 1.0 / (abs(theta - np.pi/2) + 0.1)  # Prefer more horizontal lines
-                        if score > best_score:
-                            best_score = score
-                            best_y = int(y)
-            
-            return best_y
-        
-        return height // 2  # Default to middle if no horizon found
+            # Find the most horizontal line in the middle portion of the
+            # image - scored over all lines at once instead of a Python loop
+            rho = lines[:, 0, 0]
+            theta = lines[:, 0, 1]
+
+            tilt = np.abs(theta - np.pi / 2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                y = np.where(np.sin(theta) != 0, rho / np.sin(theta), height // 2)
+
+            # Within ~11 degrees of horizontal and in the middle 60% of frame
+            valid = (tilt < 0.2) & (y > height * 0.2) & (y < height * 0.8)
+            if np.any(valid):
+                score = np.where(valid, 1.0 / (tilt + 0.1), -np.inf)  # Prefer more horizontal lines
+                return int(y[np.argmax(score)]) * scale
+
+            return frame.shape[0] // 2
+
+        return frame.shape[0] // 2  # Default to middle if no horizon found
     
     def extract_sky_region(self, frame: np.ndarray, horizon_y: int) -> np.ndarray:
         """Extract sky region from frame"""
-        height, width = frame.shape[:2]
-        
-        # Take region above horizon with some padding
-        sky_top = max(0, int(horizon_y - height * 0.1))
+        height = frame.shape[0]
+
+        # Take region above horizon. No resize to square here - the dome
+        # maps handle arbitrary source shapes, and squaring first just adds
+        # a second full-image bilinear resample for the same geometry
         sky_region = frame[0:horizon_y, :]
-        
-        # Resize to square for dome processing
-        sky_size = min(sky_region.shape[:2])
-        if sky_size > 0:
-            sky_square = cv2.resize(sky_region, (sky_size, sky_size))
-            return sky_square
-        
+        if sky_region.size > 0:
+            return sky_region
+
         # Fallback: use top portion of frame
-        top_region = frame[0:int(height * self.sky_roi_top), :]
-        return cv2.resize(top_region, (width, width))
+        return frame[0:int(height * self.sky_roi_top), :]
     
-    def apply_rotation_correction(self, frame: np.ndarray, rotation: Dict[str, float]) -> np.ndarray:
-        """Apply rotation correction to stabilize the frame"""
-        height, width = frame.shape[:2]
+    def _stabilization_matrix(self, height: int, width: int, rotation: Tuple[float, float, float]) -> np.ndarray:
+        """Update accumulated rotation and build the 2x3 stabilization affine"""
         center = (width // 2, height // 2)
-        
+        roll, pitch, yaw = rotation
+
         # Update accumulated rotation for smooth stabilization
         alpha = 0.1  # Smoothing factor
-        self.accumulated_rotation["roll"] = (1 - alpha) * self.accumulated_rotation["roll"] + alpha * rotation["roll"]
-        self.accumulated_rotation["pitch"] = (1 - alpha) * self.accumulated_rotation["pitch"] + alpha * rotation["pitch"]
-        self.accumulated_rotation["yaw"] = (1 - alpha) * self.accumulated_rotation["yaw"] + alpha * rotation["yaw"]
-        
+        self._acc_roll = (1 - alpha) * self._acc_roll + alpha * roll
+        self._acc_pitch = (1 - alpha) * self._acc_pitch + alpha * pitch
+        self._acc_yaw = (1 - alpha) * self._acc_yaw + alpha * yaw
+
         # Apply roll correction (rotation around z-axis)
-        roll_angle = -self.accumulated_rotation["roll"]  # Negative to counter-rotate
+        roll_angle = -self._acc_roll  # Negative to counter-rotate
         rotation_matrix = cv2.getRotationMatrix2D(center, roll_angle, 1.0)
-        
+
         # Apply pitch correction (simulate tilting)
-        pitch_correction = self.accumulated_rotation["pitch"] * 2  # Scale factor
+        pitch_correction = self._acc_pitch * 2  # Scale factor
         rotation_matrix[1, 2] += pitch_correction  # Vertical shift
-        
+
+        return rotation_matrix
+
+    def apply_rotation_correction(self, frame: np.ndarray, rotation: Tuple[float, float, float]) -> np.ndarray:
+        """Apply rotation correction to stabilize the frame"""
+        height, width = frame.shape[:2]
+        rotation_matrix = self._stabilization_matrix(height, width, rotation)
+
         # Apply transformation
-        stabilized = cv2.warpAffine(frame, rotation_matrix, (width, height), 
+        stabilized = cv2.warpAffine(frame, rotation_matrix, (width, height),
                                    flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
-        
+
         return stabilized
+
+    def _stabilized_dome_projection(self, frame: np.ndarray, rotation: Tuple[float, float, float], horizon_y: int) -> np.ndarray:
+        """Project the raw frame to the dome with stabilization folded in.
+
+        Composing the inverted stabilization affine onto the cached dome
+        maps means the raw frame is resampled exactly once - the
+        full-resolution warpAffine and the intermediate sky crop/resize
+        never materialize.
+        """
+        height, width = frame.shape[:2]
+        sky_size = min(horizon_y, width)
+        if sky_size <= 0:
+            sky_size = min(int(height * self.sky_roi_top), width)
+        if sky_size <= 0:
+            return np.zeros((self.dome_size, self.dome_size, 3), dtype=np.uint8)
+
+        _, _, base_x, base_y, outside = self._get_dome_maps(sky_size, sky_size)
+
+        # Dome -> sky-square coords scale up to the crop of the stabilized
+        # frame, then the inverted affine takes them back to raw coords
+        matrix = self._stabilization_matrix(height, width, rotation)
+        inverse = cv2.invertAffineTransform(matrix)
+        frame_x = base_x * np.float32(width / sky_size)
+        frame_y = base_y * np.float32(horizon_y / sky_size if horizon_y > 0 else height * self.sky_roi_top / sky_size)
+
+        map_x = inverse[0, 0] * frame_x + inverse[0, 1] * frame_y + np.float32(inverse[0, 2])
+        map_y = inverse[1, 0] * frame_x + inverse[1, 1] * frame_y + np.float32(inverse[1, 2])
+        map1, map2 = cv2.convertMaps(map_x.astype(np.float32), map_y.astype(np.float32), cv2.CV_16SC2)
+
+        dome_frame = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
+        dome_frame[outside] = [0, 0, 0]
+
+        return dome_frame
     
-    def create_dome_projection(self, sky_frame: np.ndarray) -> np.ndarray:
-        """Create dome projection from sky frame"""
-        height, width = sky_frame.shape[:2]
-        
+    def _get_dome_maps(self, height: int, width: int):
+        """Get (or build) the cached dome remap tables for a source shape"""
+        cached = self._remap_cache.get((height, width))
+        if cached is not None:
+            return cached
+
         # Create dome coordinates
         dome_radius = self.dome_size // 2
         y_dome, x_dome = np.mgrid[0:self.dome_size, 0:self.dome_size]
-        
+
         # Center coordinates
         x_dome = x_dome - dome_radius
         y_dome = y_dome - dome_radius
-        
+
         # Calculate distance from center
         r = np.sqrt(x_dome**2 + y_dome**2)
-        
+
         # Create circular mask
         mask = r <= dome_radius
-        
-        # Initialize output
-        dome_frame = np.zeros((self.dome_size, self.dome_size, 3), dtype=np.uint8)
-        
-        # Map dome coordinates to sky frame
-        valid_points = mask & (r > 0)
-        
-        if np.any(valid_points):
-            # Convert to polar coordinates
-            theta = np.arctan2(y_dome, x_dome)
-            
-            # Map radius to source coordinates (center to edge)
-            normalized_r = r / dome_radius
-            
-            # Map to sky frame coordinates
-            src_x = (width // 2) + (normalized_r * (width // 2) * np.cos(theta))
-            src_y = (height // 2) + (normalized_r * (height // 2) * np.sin(theta))
-            
-            # Ensure coordinates are within bounds
-            src_x = np.clip(src_x, 0, width - 1)
-            src_y = np.clip(src_y, 0, height - 1)
-            
-            # Create mapping arrays
-            map_x = np.zeros((self.dome_size, self.dome_size), dtype=np.float32)
-            map_y = np.zeros((self.dome_size, self.dome_size), dtype=np.float32)
-            
-            map_x[valid_points] = src_x[valid_points]
-            map_y[valid_points] = src_y[valid_points]
-            
-            # Apply mapping
-            dome_frame = cv2.remap(sky_frame, map_x, map_y, cv2.INTER_LINEAR)
-            
-            # Apply circular mask
-            dome_frame[~mask] = [0, 0, 0]
-        
+
+        # Convert to polar coordinates
+        theta = np.arctan2(y_dome, x_dome)
+
+        # Map radius to source coordinates (center to edge)
+        normalized_r = r / dome_radius
+
+        # Map to sky frame coordinates. Coordinates outside the circle get
+        # clipped like everything else - whatever remap samples there is
+        # overwritten by the mask anyway, so no separate scatter is needed
+        src_x = (width // 2) + (normalized_r * (width // 2) * np.cos(theta))
+        src_y = (height // 2) + (normalized_r * (height // 2) * np.sin(theta))
+
+        # Ensure coordinates are within bounds
+        map_x = np.clip(src_x, 0, width - 1).astype(np.float32)
+        map_y = np.clip(src_y, 0, height - 1).astype(np.float32)
+
+        # Pack the float maps into OpenCV's fixed-point format - 4 bytes of
+        # map per output pixel instead of 8, and remap's inner loop is
+        # memory-bound on exactly that traffic. The float maps are kept too
+        # so per-frame transforms can be composed onto them.
+        map1, map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+        cached = (map1, map2, map_x, map_y, ~mask)
+        self._remap_cache[(height, width)] = cached
+        return cached
+
+    def create_dome_projection(self, sky_frame: np.ndarray) -> np.ndarray:
+        """Create dome projection from sky frame"""
+        height, width = sky_frame.shape[:2]
+
+        if height == 0 or width == 0:
+            return np.zeros((self.dome_size, self.dome_size, 3), dtype=np.uint8)
+
+        # The coordinate math only depends on the source shape, so it is
+        # built once per shape and each frame is just one remap + mask
+        map_x, map_y, _, _, outside = self._get_dome_maps(height, width)
+
+        dome_frame = cv2.remap(sky_frame, map_x, map_y, cv2.INTER_LINEAR)
+        dome_frame[outside] = [0, 0, 0]
+
         return dome_frame
     
-    def process_frame(self, frame: np.ndarray, frame_number: int) -> np.ndarray:
+    def process_frame(self, frame: np.ndarray, frame_number: int,
+                      rotation: Optional[Tuple[float, float, float]] = None) -> np.ndarray:
         """Process a single frame with full pipeline"""
-        
-        # Get rotation data for this frame
-        rotation = {"roll": 0, "pitch": 0, "yaw": 0}
-        if self.rotation_processor:
-            rotation = self.rotation_processor.get_rotation_for_frame(frame_number)
-        
-        # Apply rotation correction for stabilization
-        if self.stabilization_enabled:
-            frame = self.apply_rotation_correction(frame, rotation)
-        
+
+        # Get rotation data for this frame unless the caller resolved it
+        # already (convert_video precomputes the whole clip at once)
+        if rotation is None:
+            rotation = (0.0, 0.0, 0.0)
+            if self.rotation_processor:
+                rotation = self.rotation_processor.get_rotation_for_frame(frame_number)
+
         # Detect horizon if enabled
         horizon_y = frame.shape[0] // 2
         if self.horizon_detection_enabled:
             horizon_y = self.detect_horizon(frame)
-        
+
+        # Quantize the horizon to 16px steps so the shape-keyed map caches
+        # hold a handful of entries as the detected line drifts frame to
+        # frame, instead of one entry per distinct row
+        horizon_y = max(16, (horizon_y // 16) * 16)
+
+        # With stabilization on, the correction affine is folded into the
+        # dome maps so the frame is only resampled once
+        if self.stabilization_enabled:
+            return self._stabilized_dome_projection(frame, rotation, horizon_y)
+
         # Extract sky region
         sky_frame = self.extract_sky_region(frame, horizon_y)
-        
+
         # Create dome projection
         dome_frame = self.create_dome_projection(sky_frame)
-        
+
         return dome_frame
     
     def convert_video(self):
@@ -270,44 +410,161 @@ class AdvancedDomeConverter:
         cap = cv2.VideoCapture(self.input_path)
         
         if not cap.isOpened():
-            print(f"Error: Cannot open video file {self.input_path}")
+            log.error(f"Error: Cannot open video file {self.input_path}")
             return False
         
         # Get video properties
         fps = int(cap.get(cv2.CAP_PROP_FPS))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
+        # Resolve rotations for the whole clip in one vectorized pass
+        frame_rotations = None
         if self.rotation_processor:
             self.rotation_processor.video_fps = fps
-        
-        print(f"Processing {total_frames} frames at {fps} FPS")
-        
-        # Setup output
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(self.output_path, fourcc, fps, (self.dome_size, self.dome_size))
-        
+            frame_rotations = self.rotation_processor.precompute_frame_rotations(total_frames)
+
+        log.info(f"Processing {total_frames} frames at {fps} FPS")
+        
+        # Setup output. ffmpeg encodes libx264 across all cores; raw bgr24
+        # frames go down its stdin. Falls back to cv2.VideoWriter when the
+        # binary is missing or the flag is off.
+        proc = None
+        out = None
+        if self.use_ffmpeg and shutil.which('ffmpeg'):
+            # -loglevel error keeps stderr down to actual diagnostics, so
+            # piping it can't fill and stall the encoder
+            proc = subprocess.Popen(
+                ['ffmpeg', '-y', '-loglevel', 'error',
+                 '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                 '-s', f'{self.dome_size}x{self.dome_size}', '-r', str(fps), '-i', '-',
+                 '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+                 self.output_path],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE)
+            write_frame = lambda f: proc.stdin.write(f.tobytes())
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(self.output_path, fourcc, fps, (self.dome_size, self.dome_size))
+            write_frame = out.write
+
+        # Three-stage pipeline: decode and encode release the GIL inside
+        # OpenCV, so they run on their own threads while process_frame
+        # (which carries accumulated_rotation state) stays on the main
+        # thread. Bounded queues cap in-flight frames; None is the shutdown
+        # sentinel for each stage.
+        decoded = queue.Queue(maxsize=16)
+        encoded = queue.Queue(maxsize=16)
+
+        def decode():
+            # PyAV decodes with ffmpeg's own threading (thread_type AUTO
+            # enables frame+slice parallelism) and releases the GIL for the
+            # whole decode, so prefer it when installed. Whatever happens
+            # mid-stream (a truncated file makes the decoder raise), the
+            # outer finally guarantees the sentinel - without it the main
+            # loop blocks forever on decoded.get()
+            try:
+                if av is not None:
+                    container = None
+                    try:
+                        container = av.open(self.input_path)
+                        stream = container.streams.video[0]
+                        stream.thread_type = 'AUTO'
+                    except Exception as e:
+                        log.warning(f"PyAV could not open {self.input_path} ({e}), using OpenCV decode")
+                        container = None
+                    if container is not None:
+                        try:
+                            for frame in container.decode(stream):
+                                decoded.put(frame.to_ndarray(format='bgr24'))
+                        except Exception as e:
+                            log.error(f"Decode failed mid-stream: {e}")
+                        finally:
+                            container.close()
+                        return
+
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    decoded.put(frame)
+            finally:
+                decoded.put(None)
+
+        # If the ffmpeg process dies mid-run its pipe breaks; the encoder
+        # must keep draining the queue after that or the main loop blocks
+        # forever on encoded.put() once the bounded queue fills
+        encode_failed = threading.Event()
+
+        def encode():
+            while True:
+                dome_frame = encoded.get()
+                if dome_frame is None:
+                    break
+                if encode_failed.is_set():
+                    continue
+                try:
+                    write_frame(dome_frame)
+                except OSError as e:
+                    log.error(f"Encoder write failed: {e}")
+                    encode_failed.set()
+
+        decoder = threading.Thread(target=decode, daemon=True)
+        encoder = threading.Thread(target=encode, daemon=True)
+        decoder.start()
+        encoder.start()
+
         frame_count = 0
-        
+
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            frame = decoded.get()
+            if frame is None:
                 break
-            
+
+            # The output is already lost; just drain the decoder so its
+            # thread can finish
+            if encode_failed.is_set():
+                continue
+
             # Process frame
-            dome_frame = self.process_frame(frame, frame_count)
-            
+            rotation = None
+            if frame_rotations is not None and frame_count < total_frames:
+                rolls, pitches, yaws = frame_rotations
+                rotation = (rolls[frame_count], pitches[frame_count], yaws[frame_count])
+            dome_frame = self.process_frame(frame, frame_count, rotation)
+
             # Write frame
-            out.write(dome_frame)
-            
+            encoded.put(dome_frame)
+
             frame_count += 1
-            if frame_count % 30 == 0:
+            if frame_count % max(30, total_frames // 100) == 0:
                 progress = (frame_count / total_frames) * 100
-                print(f"Progress: {progress:.1f}% ({frame_count}/{total_frames})")
-        
+                log.info(f"Progress: {progress:.1f}% ({frame_count}/{total_frames})")
+
+        encoded.put(None)
+        decoder.join()
+        encoder.join()
+
         cap.release()
-        out.release()
-        
-        print(f"Conversion complete! Output: {self.output_path}")
+        if proc is not None:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+            proc.wait()
+            stderr_tail = proc.stderr.read().decode(errors='replace').strip()
+            proc.stderr.close()
+            if proc.returncode != 0 or encode_failed.is_set():
+                log.error(f"ffmpeg exited with code {proc.returncode}"
+                          + (f": {stderr_tail}" if stderr_tail else ""))
+                return False
+        else:
+            out.release()
+            if encode_failed.is_set():
+                log.error("Encoder failed; output is incomplete")
+                return False
+
+        log.info(f"Conversion complete! Output: {self.output_path}")
         return True
     
     def extract_sample_frames(self, sample_count: int = 5):
@@ -315,7 +572,7 @@ class AdvancedDomeConverter:
         cap = cv2.VideoCapture(self.input_path)
         
         if not cap.isOpened():
-            print(f"Error: Cannot open video file {self.input_path}")
+            log.error(f"Error: Cannot open video file {self.input_path}")
             return False
         
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -327,28 +584,42 @@ class AdvancedDomeConverter:
         output_dir = Path(self.output_path).parent
         base_name = Path(self.output_path).stem
         
-        # Sample frames evenly distributed
-        sample_frames = [int(i * total_frames / sample_count) for i in range(sample_count)]
-        
-        for i, frame_num in enumerate(sample_frames):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-            ret, frame = cap.read()
-            
+        # Sample frames evenly distributed. One linear pass with grab()
+        # instead of CAP_PROP_POS_FRAMES seeks - each random seek forces a
+        # re-decode from the previous keyframe, while grab() skips the
+        # colorspace conversion for every frame we don't keep
+        sample_frames = sorted(int(i * total_frames / sample_count) for i in range(sample_count))
+        sample_set = set(sample_frames)
+
+        saved = 0
+        for frame_num in range(total_frames):
+            if not cap.grab():
+                break
+            if frame_num not in sample_set:
+                continue
+
+            ret, frame = cap.retrieve()
             if ret:
                 # Process frame
                 dome_frame = self.process_frame(frame, frame_num)
-                
+
                 # Save original and processed
-                cv2.imwrite(str(output_dir / f"{base_name}_original_{i}.jpg"), frame)
-                cv2.imwrite(str(output_dir / f"{base_name}_dome_{i}.jpg"), dome_frame)
-                
-                print(f"Saved sample {i+1}/{sample_count} (frame {frame_num})")
-        
+                cv2.imwrite(str(output_dir / f"{base_name}_original_{saved}.jpg"), frame)
+                cv2.imwrite(str(output_dir / f"{base_name}_dome_{saved}.jpg"), dome_frame)
+
+                saved += 1
+                log.info(f"Saved sample {saved}/{sample_count} (frame {frame_num})")
+
+            if saved == sample_count:
+                break
+
         cap.release()
-        print(f"Sample frames saved in {output_dir}")
+        log.info(f"Sample frames saved in {output_dir}")
         return True
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     if len(sys.argv) < 2:
         print("Usage: python advanced_dome.py <input_video> [output_video] [rotation_data.json] [flags]")
         print("Flags:")
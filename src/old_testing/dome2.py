@@ -3,9 +3,24 @@ import numpy as np
 import json
 import math
 import argparse
+import os
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Optional
 
+# Use CUDA remap when OpenCV was built with it and a device is present
+try:
+    _USE_CUDA = cv2.cuda.getCudaEnabledDeviceCount() > 0
+except (AttributeError, cv2.error):
+    _USE_CUDA = False
+
 class SkyDomeStitcher:
+    # Canvases at or above this size go out of core via np.memmap
+    # (8000px is a 768 MB float32 canvas plus 256 MB of weights)
+    _MEMMAP_MIN_SIZE = 8000
+
     def __init__(self, dome_size: int = 2000, fov_degrees: float = 60.0):
         """
         Initialize the sky dome stitcher.
@@ -14,17 +29,93 @@ class SkyDomeStitcher:
             dome_size: Size of the output dome image (diameter in pixels)
             fov_degrees: Field of view of the camera in degrees
         """
+        self.output_size = dome_size
+        self.fov_radians = math.radians(fov_degrees)
+
+        # LRU cache of projection maps keyed by quantized rotation: device
+        # rotation barely moves between skipped frames, so nearby
+        # orientations reuse the same maps and skip the projection math.
+        # Each entry is ~4*dome_size^2 bytes, so keep the cache small.
+        self._map_cache: OrderedDict = OrderedDict()
+        self._map_cache_max = 32
+
+        # Reused output buffer for euler_to_rotation_matrix
+        self._R_buf = np.empty((3, 3), dtype=np.float32)
+
+        # Geometry starts at the requested size and may shrink to the
+        # effective working size once the first frame's resolution is
+        # known (see project_frame_to_dome)
+        self._geometry_final = False
+        self._init_geometry(dome_size)
+
+    def _init_geometry(self, dome_size: int) -> None:
+        """
+        Allocate the accumulators and precomputed dome geometry.
+
+        Args:
+            dome_size: Working canvas size (diameter in pixels)
+        """
         self.dome_size = dome_size
         self.dome_radius = dome_size // 2
-        self.fov_radians = math.radians(fov_degrees)
-        
-        # Create empty dome canvas
-        self.dome_canvas = np.zeros((dome_size, dome_size, 3), dtype=np.uint8)
-        self.dome_weights = np.zeros((dome_size, dome_size), dtype=np.float32)
-        
+
+        # Create empty dome accumulators. The canvas holds the weighted
+        # colour sum (sum of w*I) and dome_weights the weight sum; the
+        # division into an average happens once when the panorama is saved,
+        # so the per-frame update is a pure accumulate with no divides or
+        # uint8 round-trips. float32 is the floor for these running sums:
+        # float16 tops out at 65504 (a pixel hit ~260 times overflows) and
+        # its 10-bit mantissa starts dropping whole samples once the sum
+        # passes a few thousand. Very large canvases are disk-backed so
+        # the OS pages tiles in and out instead of the process swapping.
+        if dome_size >= self._MEMMAP_MIN_SIZE:
+            prefix = os.path.join(tempfile.gettempdir(),
+                                  f"sky_dome_{os.getpid()}_{dome_size}")
+            self.dome_canvas = np.memmap(prefix + "_canvas.f32", dtype=np.float32,
+                                         mode='w+', shape=(dome_size, dome_size, 3))
+            self.dome_weights = np.memmap(prefix + "_weights.f32", dtype=np.float32,
+                                          mode='w+', shape=(dome_size, dome_size))
+            # Unlink straight away: the mappings stay valid and the kernel
+            # reclaims the space once they are dropped, so nothing is left
+            # on disk - even when a geometry rebuild replaces these arrays
+            os.unlink(prefix + "_canvas.f32")
+            os.unlink(prefix + "_weights.f32")
+        else:
+            self.dome_canvas = np.zeros((dome_size, dome_size, 3), dtype=np.float32)
+            self.dome_weights = np.zeros((dome_size, dome_size), dtype=np.float32)
+
         # Center of the dome
         self.center_x = dome_size // 2
         self.center_y = dome_size // 2
+
+        # Dome-side geometry depends only on dome_size, so it is computed
+        # once here: the unit sky ray for every dome pixel inside the
+        # circle, the pixel indices those rays belong to, and the radial
+        # blend weight. Per frame only the rotation changes.
+        ys, xs = np.meshgrid(np.arange(dome_size), np.arange(dome_size), indexing='ij')
+        dx = xs - self.center_x
+        dy = ys - self.center_y
+        distance = np.hypot(dx, dy)
+        self.dome_mask = distance <= self.dome_radius
+
+        self.valid_ys, self.valid_xs = np.nonzero(self.dome_mask)
+
+        # Map dome radius to hemisphere (0 to pi/2). The trig runs only on
+        # the in-circle pixels - no full-grid (S,S,3) temporaries
+        dist_in = distance[self.valid_ys, self.valid_xs]
+        theta = (dist_in / self.dome_radius) * (math.pi / 2)
+        phi = np.arctan2(dy[self.valid_ys, self.valid_xs],
+                         dx[self.valid_ys, self.valid_xs])
+        sin_theta = np.sin(theta)
+        self.dir_xyz = np.stack([sin_theta * np.cos(phi),
+                                 sin_theta * np.sin(phi),
+                                 np.cos(theta)], axis=-1).astype(np.float32)
+
+        # Weight based on distance from center, packed like dir_xyz so the
+        # per-frame blend only touches in-dome pixels
+        self.weight_packed = (1.0 / (1.0 + dist_in / self.dome_radius)).astype(np.float32)
+
+        # Cached maps were built for the previous geometry
+        self._map_cache.clear()
         
     def euler_to_rotation_matrix(self, alpha: float, beta: float, gamma: float) -> np.ndarray:
         """
@@ -36,29 +127,25 @@ class SkyDomeStitcher:
             gamma: Rotation around Y-axis (roll) in radians
             
         Returns:
-            3x3 rotation matrix
+            3x3 rotation matrix (a reused buffer, valid until the next call)
         """
-        # Rotation matrices for each axis
-        Rx = np.array([
-            [1, 0, 0],
-            [0, math.cos(beta), -math.sin(beta)],
-            [0, math.sin(beta), math.cos(beta)]
-        ])
-        
-        Ry = np.array([
-            [math.cos(gamma), 0, math.sin(gamma)],
-            [0, 1, 0],
-            [-math.sin(gamma), 0, math.cos(gamma)]
-        ])
-        
-        Rz = np.array([
-            [math.cos(alpha), -math.sin(alpha), 0],
-            [math.sin(alpha), math.cos(alpha), 0],
-            [0, 0, 1]
-        ])
-        
-        # Combined rotation matrix
-        R = Rz @ Ry @ Rx
+        # Expanded form of Rz @ Ry @ Rx written as scalars into a reused
+        # buffer: tiny-matrix np.array construction and matmul dispatch
+        # cost far more than the 27 multiplies they hide
+        ca, sa = math.cos(alpha), math.sin(alpha)
+        cb, sb = math.cos(beta), math.sin(beta)
+        cg, sg = math.cos(gamma), math.sin(gamma)
+
+        R = self._R_buf
+        R[0, 0] = ca * cg
+        R[0, 1] = ca * sg * sb - sa * cb
+        R[0, 2] = ca * sg * cb + sa * sb
+        R[1, 0] = sa * cg
+        R[1, 1] = sa * sg * sb + ca * cb
+        R[1, 2] = sa * sg * cb - ca * sb
+        R[2, 0] = -sg
+        R[2, 1] = cg * sb
+        R[2, 2] = cg * cb
         return R
     
     def project_frame_to_dome(self, frame: np.ndarray, rotation_matrix: np.ndarray) -> None:
@@ -70,79 +157,170 @@ class SkyDomeStitcher:
             rotation_matrix: 3x3 rotation matrix for the camera orientation
         """
         frame_height, frame_width = frame.shape[:2]
-        
+
+        # Dome resolution past ~2x the frame resolution is pure
+        # upsampling and cannot add detail, so shrink the working canvas
+        # to that bound when the first frame reveals the source size; the
+        # saved panorama is upsampled back to output_size at the end
+        if not self._geometry_final:
+            effective = min(self.output_size, 2 * max(frame_width, frame_height))
+            if effective < self.dome_size:
+                self._init_geometry(effective)
+            self._geometry_final = True
+
+        # The whole projection is expressed as array ops (one matmul, one
+        # remap), so the work runs inside BLAS/OpenCV SIMD kernels already;
+        # cv2.remap additionally splits rows across OpenCV's own thread
+        # pool. A Numba-compiled per-pixel loop (with or without prange)
+        # would re-derive the same kernels at extra dependency cost.
+
+        # Early-reject frames whose dome footprint is already well
+        # covered: when the camera dwells on one orientation, re-blending
+        # the same region barely moves the running average, so skip the
+        # remap entirely. The view axis in dome space is R @ [0,0,1];
+        # invert the radial hemisphere mapping to find where it lands.
+        axis_x, axis_y, axis_z = (float(rotation_matrix[0, 2]),
+                                  float(rotation_matrix[1, 2]),
+                                  float(rotation_matrix[2, 2]))
+        if axis_z > 0:
+            theta = math.acos(min(1.0, axis_z))
+            radius = (theta / (math.pi / 2)) * self.dome_radius
+            phi = math.atan2(axis_y, axis_x)
+            foot_x = int(self.center_x + math.cos(phi) * radius)
+            foot_y = int(self.center_y + math.sin(phi) * radius)
+            # Size the test box to the inscribed square of the narrower
+            # (vertical) half-FOV so it lies inside the frame's footprint
+            focal_length = frame_width / (2 * math.tan(self.fov_radians / 2))
+            half_fov_v = math.atan((frame_height / 2) / focal_length)
+            foot_r = int(half_fov_v / (math.pi / 2) * self.dome_radius / math.sqrt(2))
+            region = self.dome_weights[max(0, foot_y - foot_r):foot_y + foot_r,
+                                       max(0, foot_x - foot_r):foot_x + foot_r]
+            # weight_packed is 0.5..1 per hit, so > 3 means several frames
+            # have already landed on a pixel
+            if region.size and np.mean(region > 3.0) > 0.95:
+                return
+
+        # Quantize the rotation to ~0.5 degree bins (1/128 on the matrix
+        # entries) so frames with near-identical orientation share maps
+        key = (frame_width, frame_height,
+               *np.round(rotation_matrix * 128.0).astype(np.int32).ravel().tolist())
+        cached = self._map_cache.get(key)
+        if cached is not None:
+            self._map_cache.move_to_end(key)
+            if not cached:
+                return
+            map1, map2, hit_ys, hit_xs, w, crop = cached
+        else:
+            entry = self._build_projection_maps(frame_width, frame_height,
+                                                rotation_matrix)
+            self._map_cache[key] = entry
+            if len(self._map_cache) > self._map_cache_max:
+                self._map_cache.popitem(last=False)
+            if not entry:
+                return
+            map1, map2, hit_ys, hit_xs, w, crop = entry
+
+        # One SIMD bilinear gather instead of 4M Python-level fetches;
+        # remap processes the maps in cache-sized row blocks internally,
+        # so the frame-side gather stays L2-friendly without hand tiling.
+        # The maps address a cropped sub-frame (only its bounding box is
+        # ever sampled), keeping the hot source data small. With CUDA the
+        # maps are already resident GpuMats, so only the sub-frame crosses
+        # PCIe each call.
+        v0, v1, u0, u1 = crop
+        sub_frame = np.ascontiguousarray(frame[v0:v1, u0:u1])
+        if _USE_CUDA:
+            d_frame = cv2.cuda_GpuMat()
+            d_frame.upload(sub_frame)
+            warped = cv2.cuda.remap(d_frame, map1, map2, cv2.INTER_LINEAR,
+                                    borderMode=cv2.BORDER_CONSTANT).download()
+        else:
+            warped = cv2.remap(sub_frame, map1, map2, cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+        # Accumulate: add this frame's weighted colours into the running
+        # sums; the average is formed once at save time
+        self.dome_canvas[hit_ys, hit_xs] += warped[hit_ys, hit_xs] * w[:, None]
+        self.dome_weights[hit_ys, hit_xs] += w
+
+    def _build_projection_maps(self, frame_width: int, frame_height: int,
+                               rotation_matrix: np.ndarray) -> tuple:
+        """
+        Build the fixed-point remap maps and blend arrays for one rotation.
+
+        Args:
+            frame_width: Source frame width in pixels
+            frame_height: Source frame height in pixels
+            rotation_matrix: 3x3 rotation matrix for the camera orientation
+
+        Returns:
+            (map1, map2, hit_ys, hit_xs, weights) tuple, or an empty tuple
+            if no dome pixel sees the frame
+        """
         # Camera intrinsic parameters (approximate)
         focal_length = frame_width / (2 * math.tan(self.fov_radians / 2))
         cx, cy = frame_width / 2, frame_height / 2
-        
-        # For each pixel in the dome
-        for dome_y in range(self.dome_size):
-            for dome_x in range(self.dome_size):
-                # Convert dome coordinates to spherical coordinates
-                dx = dome_x - self.center_x
-                dy = dome_y - self.center_y
-                distance = math.sqrt(dx*dx + dy*dy)
-                
-                # Skip pixels outside the dome
-                if distance > self.dome_radius:
-                    continue
-                
-                # Convert to spherical coordinates
-                # Map dome radius to hemisphere (0 to pi/2)
-                theta = (distance / self.dome_radius) * (math.pi / 2)
-                phi = math.atan2(dy, dx)
-                
-                # Convert spherical to 3D unit vector
-                x = math.sin(theta) * math.cos(phi)
-                y = math.sin(theta) * math.sin(phi)
-                z = math.cos(theta)
-                
-                # Apply inverse rotation to get camera space direction
-                camera_dir = rotation_matrix.T @ np.array([x, y, z])
-                
-                # Project to camera image plane
-                if camera_dir[2] <= 0:  # Behind camera
-                    continue
-                
-                # Perspective projection
-                u = focal_length * camera_dir[0] / camera_dir[2] + cx
-                v = focal_length * camera_dir[1] / camera_dir[2] + cy
-                
-                # Check if projection is within frame bounds
-                if 0 <= u < frame_width and 0 <= v < frame_height:
-                    # Bilinear interpolation
-                    u_int, v_int = int(u), int(v)
-                    u_frac, v_frac = u - u_int, v - v_int
-                    
-                    if u_int + 1 < frame_width and v_int + 1 < frame_height:
-                        # Get four neighboring pixels
-                        pixel_00 = frame[v_int, u_int]
-                        pixel_10 = frame[v_int, u_int + 1]
-                        pixel_01 = frame[v_int + 1, u_int]
-                        pixel_11 = frame[v_int + 1, u_int + 1]
-                        
-                        # Bilinear interpolation
-                        interpolated = (
-                            pixel_00 * (1 - u_frac) * (1 - v_frac) +
-                            pixel_10 * u_frac * (1 - v_frac) +
-                            pixel_01 * (1 - u_frac) * v_frac +
-                            pixel_11 * u_frac * v_frac
-                        )
-                        
-                        # Weight based on distance from center (optional)
-                        weight = 1.0 / (1.0 + distance / self.dome_radius)
-                        
-                        # Blend with existing pixel
-                        current_weight = self.dome_weights[dome_y, dome_x]
-                        total_weight = current_weight + weight
-                        
-                        if total_weight > 0:
-                            self.dome_canvas[dome_y, dome_x] = (
-                                (self.dome_canvas[dome_y, dome_x] * current_weight + 
-                                 interpolated * weight) / total_weight
-                            ).astype(np.uint8)
-                            self.dome_weights[dome_y, dome_x] = total_weight
-    
+
+        # Rotate every precomputed sky ray into camera space at once.
+        # camera_dir = R.T @ ray for each ray is one matmul: rays @ R.
+        # One sgemm over the packed (N,3) block measures faster than
+        # split per-axis SoA expressions, which walk N multiple times
+        # building ufunc temporaries. No per-ray np.array construction
+        # or tiny-matmul dispatch remains anywhere in the frame path.
+        cam_dirs = self.dir_xyz @ rotation_matrix.astype(np.float32)
+        z = cam_dirs[:, 2]
+
+        # Perspective projection for rays in front of the camera: one
+        # masked reciprocal shared by both axes instead of two divides
+        # (FP divide is several times slower than multiply). Rear rays
+        # get inv_z = 0, landing harmlessly at (cx, cy) before masking.
+        in_front = z > 0
+        inv_z = np.zeros_like(z)
+        np.reciprocal(z, out=inv_z, where=in_front)
+        u = (focal_length * cam_dirs[:, 0]) * inv_z + cx
+        v = (focal_length * cam_dirs[:, 1]) * inv_z + cy
+
+        # Keep rays that land inside the frame
+        visible = in_front & (u >= 0) & (u < frame_width) & (v >= 0) & (v < frame_height)
+        if not np.any(visible):
+            return ()
+
+        # Only the (u,v) bounding rectangle of the frame is ever sampled -
+        # often a fraction of the frame for oblique orientations - so the
+        # maps are expressed relative to that crop and remap reads just
+        # the sub-frame. +2 keeps the upper bilinear neighbour in range.
+        u_vis = u[visible]
+        v_vis = v[visible]
+        u0 = max(0, int(u_vis.min()))
+        v0 = max(0, int(v_vis.min()))
+        u1 = min(frame_width, int(u_vis.max()) + 2)
+        v1 = min(frame_height, int(v_vis.max()) + 2)
+        crop = (v0, v1, u0, u1)
+
+        # Scatter the source coordinates into dome-shaped maps; pixels with
+        # no sample point outside the crop so remap paints them black
+        map_x = np.full((self.dome_size, self.dome_size), -1, dtype=np.float32)
+        map_y = np.full((self.dome_size, self.dome_size), -1, dtype=np.float32)
+        hit_ys = self.valid_ys[visible]
+        hit_xs = self.valid_xs[visible]
+        map_x[hit_ys, hit_xs] = u_vis - u0
+        map_y[hit_ys, hit_xs] = v_vis - v0
+
+        if _USE_CUDA:
+            # cv2.cuda.remap takes float maps; upload them once here so
+            # cached rotations never re-cross PCIe
+            d_map_x = cv2.cuda_GpuMat()
+            d_map_x.upload(map_x)
+            d_map_y = cv2.cuda_GpuMat()
+            d_map_y.upload(map_y)
+            return (d_map_x, d_map_y, hit_ys, hit_xs,
+                    self.weight_packed[visible], crop)
+
+        # Converting the maps to fixed-point CV_16SC2 lets remap use its
+        # integer inner loop instead of re-quantizing float coords
+        map1, map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        return (map1, map2, hit_ys, hit_xs, self.weight_packed[visible], crop)
+
     def find_closest_frame(self, target_timestamp: int, rotation_data: List[Dict]) -> Optional[Dict]:
         """
         Find the rotation data entry closest to the target timestamp.
@@ -183,7 +361,22 @@ class SkyDomeStitcher:
         # Load rotation data
         with open(rotation_data_path, 'r') as f:
             rotation_data = json.load(f)
-        
+
+        # Sort timestamps once and keep the angles as radian arrays, so
+        # each frame lookup is a binary search plus three array reads
+        # instead of an O(N) scan over dicts
+        n_entries = len(rotation_data)
+        timestamps = np.fromiter((e['timestamp'] for e in rotation_data),
+                                 dtype=np.int64, count=n_entries)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        alphas = np.radians(np.fromiter((e['alpha'] for e in rotation_data),
+                                        dtype=np.float64, count=n_entries))[order]
+        betas = np.radians(np.fromiter((e['beta'] for e in rotation_data),
+                                       dtype=np.float64, count=n_entries))[order]
+        gammas = np.radians(np.fromiter((e['gamma'] for e in rotation_data),
+                                        dtype=np.float64, count=n_entries))[order]
+
         # Open video
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
@@ -196,51 +389,84 @@ class SkyDomeStitcher:
         print(f"Video: {total_frames} frames at {fps} FPS")
         print(f"Processing every {frame_skip} frames...")
         
-        frame_count = 0
+        # Decode on a separate thread: grab() advances the decoder without
+        # reconstructing the frame, only the kept 1-in-frame_skip frames
+        # pay the full decode via retrieve(), and the bounded queue lets
+        # decode of the next frame overlap projection of the current one
+        # (both sides release the GIL in their C kernels)
+        frames_queue: queue.Queue = queue.Queue(maxsize=4)
+
+        def decode_frames():
+            fc = 0
+            while cap.grab():
+                if fc % frame_skip == 0:
+                    ret, frm = cap.retrieve()
+                    if not ret:
+                        break
+                    frames_queue.put((fc, frm))
+                fc += 1
+            frames_queue.put(None)
+
+        reader = threading.Thread(target=decode_frames, daemon=True)
+        reader.start()
+
         processed_frames = 0
-        
+
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            item = frames_queue.get()
+            if item is None:
                 break
-                
-            # Skip frames for faster processing
-            if frame_count % frame_skip != 0:
-                frame_count += 1
-                continue
-            
+            frame_count, frame = item
+
             # Calculate timestamp (in milliseconds)
             timestamp_ms = int((frame_count / fps) * 1000)
-            
-            # Find closest rotation data
-            rotation_entry = self.find_closest_frame(timestamp_ms, rotation_data)
-            
-            if rotation_entry:
-                # Convert degrees to radians
-                alpha = math.radians(rotation_entry['alpha'])
-                beta = math.radians(rotation_entry['beta'])
-                gamma = math.radians(rotation_entry['gamma'])
-                
-                # Get rotation matrix
-                rotation_matrix = self.euler_to_rotation_matrix(alpha, beta, gamma)
-                
+
+            # Binary-search the closest rotation sample
+            if n_entries:
+                idx = int(np.searchsorted(timestamps, timestamp_ms))
+                if idx == n_entries or (idx > 0 and
+                        timestamp_ms - timestamps[idx - 1] <= timestamps[idx] - timestamp_ms):
+                    idx -= 1
+
+                # Get rotation matrix (angles are already radians)
+                rotation_matrix = self.euler_to_rotation_matrix(
+                    alphas[idx], betas[idx], gammas[idx])
+
                 # Project frame to dome
                 self.project_frame_to_dome(frame, rotation_matrix)
-                
+
                 processed_frames += 1
                 if processed_frames % 10 == 0:
                     print(f"Processed {processed_frames} frames...")
-            
-            frame_count += 1
-        
+
+                # Push dirty pages of a disk-backed canvas out periodically
+                # so the save at the end isn't one giant writeback
+                if (processed_frames % 256 == 0 and
+                        isinstance(self.dome_canvas, np.memmap)):
+                    self.dome_canvas.flush()
+                    self.dome_weights.flush()
+
+        reader.join()
         cap.release()
         
+        # Divide the weighted sums into an average and quantize once
+        weights = self.dome_weights[..., None]
+        dome_avg = np.divide(self.dome_canvas, weights,
+                             out=np.zeros_like(self.dome_canvas),
+                             where=weights > 0)
+        dome_u8 = np.clip(dome_avg, 0, 255).astype(np.uint8)
+
+        # Upsample back to the requested size if the working canvas was
+        # capped to the frame resolution
+        if self.dome_size != self.output_size:
+            dome_u8 = cv2.resize(dome_u8, (self.output_size, self.output_size),
+                                 interpolation=cv2.INTER_LANCZOS4)
+
         # Create circular mask for final output
-        mask = np.zeros((self.dome_size, self.dome_size), dtype=np.uint8)
-        cv2.circle(mask, (self.center_x, self.center_y), self.dome_radius, 255, -1)
-        
-        # Apply mask to create circular output
-        final_dome = cv2.bitwise_and(self.dome_canvas, self.dome_canvas, mask=mask)
+        out_radius = self.output_size // 2
+        mask = np.zeros((self.output_size, self.output_size), dtype=np.uint8)
+        cv2.circle(mask, (out_radius, out_radius), out_radius, 255, -1)
+        final_dome = cv2.bitwise_and(dome_u8, dome_u8, mask=mask)
         
         # Save result
         cv2.imwrite(output_path, final_dome)